@@ -107,6 +107,12 @@ class AccountType:
         OTHER_EXPENSE
     })
     
+    # P&L income types (credits stored negative, flipped × -1 for reporting)
+    INCOME_TYPES = frozenset({
+        INCOME, 
+        OTHER_INCOME
+    })
+    
     # All Balance Sheet asset types
     BS_ASSET_TYPES = frozenset({
         BANK, 
@@ -164,6 +170,11 @@ class AccountType:
         """Check if account type is P&L (Income Statement)"""
         return accttype in cls.PL_TYPES
     
+    @classmethod
+    def is_income(cls, accttype):
+        """Check if account type is Income/OthIncome (P&L sign flip)"""
+        return accttype in cls.INCOME_TYPES
+    
     @classmethod
     def needs_sign_flip(cls, accttype):
         """Check if account type needs sign flip for reporting"""
@@ -0,0 +1,149 @@
+"""
+XAVI for NetSuite - Persistent Disk Cache
+SQLite-backed store so lookup data survives server restarts
+
+Copyright (c) 2025 Celigo, Inc.
+All rights reserved.
+
+This source code is proprietary and confidential. Unauthorized copying,
+modification, distribution, or use of this software, via any medium,
+is strictly prohibited without the express written permission of Celigo, Inc.
+
+For licensing inquiries, contact: legal@celigo.com
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Cache file lives next to server.py (ignored by git)
+CACHE_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache.db')
+
+# Lookup data (subsidiaries, departments, periods, account titles) changes rarely
+LOOKUP_TTL = 24 * 60 * 60  # 24 hours in seconds
+
+_conn = None
+_lock = threading.Lock()
+
+# Failures are logged and swallowed - the cache is an optimization, never a hard dependency
+logger = logging.getLogger(__name__)
+
+
+def _get_conn():
+    """Open the cache database once (WAL mode so worker threads can read concurrently)"""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(CACHE_DB_PATH, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        _conn.commit()
+    return _conn
+
+
+def get(namespace, key, ttl):
+    """Return the cached value, or None if missing / older than ttl seconds"""
+    try:
+        with _lock:
+            row = _get_conn().execute(
+                "SELECT value, stored_at FROM cache WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            ).fetchone()
+        if row and (time.time() - row[1]) < ttl:
+            return json.loads(row[0])
+    except Exception as e:
+        logger.warning("Disk cache read error (%s/%s): %s", namespace, key, e)
+    return None
+
+
+def put(namespace, key, value):
+    """Store a single JSON-serializable value"""
+    put_many(namespace, {key: value})
+
+
+def _insert_rows(conn, namespace, items):
+    """INSERT OR REPLACE items into namespace on conn (caller commits)"""
+    now = time.time()
+    conn.executemany(
+        "INSERT OR REPLACE INTO cache (namespace, key, value, stored_at) VALUES (?, ?, ?, ?)",
+        [(namespace, str(k), json.dumps(v), now) for k, v in items.items()]
+    )
+
+
+def put_many(namespace, items):
+    """Store many {key: value} pairs in one transaction"""
+    if not items:
+        return
+    try:
+        with _lock:
+            conn = _get_conn()
+            with conn:  # commits, or rolls back on error
+                _insert_rows(conn, namespace, items)
+    except Exception as e:
+        logger.warning("Disk cache write error (%s): %s", namespace, e)
+
+
+def replace_namespace(namespace, items):
+    """
+    Replace everything stored under namespace with items (snapshot semantics).
+    
+    The DELETE and the INSERTs share one transaction, so a crash or error midway
+    leaves the previous snapshot in place rather than an empty namespace.
+    """
+    try:
+        with _lock:
+            conn = _get_conn()
+            with conn:
+                conn.execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
+                _insert_rows(conn, namespace, items)
+    except Exception as e:
+        logger.warning("Disk cache replace error (%s): %s", namespace, e)
+
+
+def purge_expired(namespace, ttl):
+    """Delete entries in namespace older than ttl seconds (reads skip them, but they'd stay on disk)"""
+    try:
+        with _lock:
+            conn = _get_conn()
+            conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND stored_at <= ?",
+                (namespace, time.time() - ttl)
+            )
+            conn.commit()
+    except Exception as e:
+        logger.warning("Disk cache purge error (%s): %s", namespace, e)
+
+
+def load_namespace(namespace, ttl):
+    """
+    Load all fresh entries for a namespace.
+
+    Returns:
+        (dict of key → value, oldest stored_at timestamp or None)
+    """
+    items = {}
+    oldest = None
+    try:
+        cutoff = time.time() - ttl
+        with _lock:
+            rows = _get_conn().execute(
+                "SELECT key, value, stored_at FROM cache WHERE namespace = ? AND stored_at > ?",
+                (namespace, cutoff)
+            ).fetchall()
+        for key, value, stored_at in rows:
+            items[key] = json.loads(value)
+            if oldest is None or stored_at < oldest:
+                oldest = stored_at
+    except Exception as e:
+        logger.warning("Disk cache load error (%s): %s", namespace, e)
+    return items, oldest
@@ -12,18 +12,57 @@ is strictly prohibited without the express written permission of Celigo, Inc.
 For licensing inquiries, contact: legal@celigo.com
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import json
+import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from requests_oauthlib import OAuth1
+import calendar
+import gzip
+import hashlib
 import sys
 import threading
 import time
 from datetime import datetime
-from dateutil import parser as date_parser
 from dateutil.relativedelta import relativedelta
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from collections import OrderedDict
+from functools import lru_cache
+
+# Fast JSON parsing for large SuiteQL responses (orjson parses bytes directly)
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    json_loads = json.loads
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson (used by every jsonify call when installed).
+    
+    Lookup and batch responses carry thousands of entries; orjson serializes them
+    several times faster than the stdlib encoder. Types orjson doesn't know
+    (Decimal, date, ...) fall back to Flask's default handling.
+    """
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS),
+            mimetype=self.mimetype
+        )
 
 # Rate limiting for NetSuite API calls
 NETSUITE_CONCURRENCY_LIMIT = 4  # NetSuite allows 5, keep 1 buffer
@@ -38,9 +77,141 @@ from constants import (
     BS_ASSET_TYPES_SQL, BS_LIABILITY_TYPES_SQL, BS_EQUITY_TYPES_SQL
 )
 
+# Persistent SQLite cache so lookups/balances survive server restarts
+import disk_cache
+
 app = Flask(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
 CORS(app)  # Enable CORS for Excel add-in
 
+class TTLCache:
+    """
+    Thread-safe dict-like cache with per-entry expiry and LRU eviction.
+    
+    Entries expire individually (ttl seconds after being set; ttl=None = never),
+    and the least-recently-used entry is evicted once maxsize is reached.
+    Tracks hit/miss counters for /cache/stats.
+    """
+    
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key → (value, expires_at or None)
+        self._lock = threading.RLock()
+    
+    def _is_live(self, entry):
+        return entry[1] is None or entry[1] > time.time()
+    
+    def set(self, key, value, ttl=None):
+        """Store value; ttl overrides the cache default (used when restoring from disk)"""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def __setitem__(self, key, value):
+        self.set(key, value)
+    
+    def set_many(self, items):
+        """Bulk set of (key, value) pairs under one lock acquisition (default ttl)"""
+        expires_at = time.time() + self.ttl if self.ttl is not None else None
+        count = 0
+        with self._lock:
+            for key, value in items:
+                self._data[key] = (value, expires_at)
+                self._data.move_to_end(key)
+                count += 1
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return count
+    
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self._is_live(entry):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+    
+    def get_many(self, keys):
+        """
+        All-or-nothing bulk lookup under one lock acquisition.
+        
+        Returns the values in key order, or None as soon as any key is missing/expired.
+        """
+        now = time.time()
+        values = []
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is None or (entry[1] is not None and entry[1] <= now):
+                    self.misses += 1
+                    return None
+                values.append(entry[0])
+            for key in keys:
+                self._data.move_to_end(key)
+            self.hits += len(values)
+        return values
+    
+    def __getitem__(self, key):
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            raise KeyError(key)
+        return value
+    
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and self._is_live(entry)
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+    
+    def keys(self):
+        return [k for k, _ in self.items()]
+    
+    def items(self):
+        with self._lock:
+            return [(k, e[0]) for k, e in self._data.items() if self._is_live(e)]
+    
+    def items_with_expiry(self):
+        """Live (key, value, expires_at or None) triples - for persisting with each entry's own expiry"""
+        with self._lock:
+            return [(k, e[0], e[1]) for k, e in self._data.items() if self._is_live(e)]
+    
+    def update(self, other):
+        for key, value in other.items():
+            self.set(key, value)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else None
+            }
+
+
 # In-memory cache for name-to-ID lookups (refreshes on server restart)
 lookup_cache = {
     'subsidiaries': {},  # name → id
@@ -49,16 +220,66 @@ lookup_cache = {
     'locations': {},     # name → id
     'periods': {},       # period name → id (for date range performance)
     'currencies': {},    # subsidiary_id → currency_symbol (for cell formatting)
-    'budget_categories': {}  # name → id (prevents 429 errors on budget batches)
+    'budget_categories': {},  # name → id (prevents 429 errors on budget batches)
+    'subsidiaries_enriched': []  # pre-built dropdown list for /lookups/all (incl. Consolidated entries)
 }
 cache_loaded = False
+# True once the lookup load confirms the account has exactly one subsidiary -
+# query builders then emit plain tal.amount instead of BUILTIN.CONSOLIDATE
+single_subsidiary = False
+# Guards the one-time load; reads after cache_loaded is set rely on GIL-safe dict gets
+lookup_cache_lock = threading.Lock()
 
 # In-memory cache for balance data (from full year refresh)
 # Structure: { 'account:period:filters_hash': balance_value }
-# Expires after 5 minutes
-balance_cache = {}
-balance_cache_timestamp = None
+# Each entry expires 5 minutes after it was cached; bounded to BALANCE_CACHE_MAXSIZE (LRU)
 BALANCE_CACHE_TTL = 300  # 5 minutes in seconds
+BALANCE_CACHE_MAXSIZE = 100_000
+balance_cache = TTLCache(maxsize=BALANCE_CACHE_MAXSIZE, ttl=BALANCE_CACHE_TTL)
+
+
+def make_filters_hash(subsidiary, department, location, class_id):
+    """
+    Filter portion of balance_cache keys - interned, since it's shared by every key of a request.
+    
+    Ends with the single_subsidiary mode (1/0): it changes the amount SQL (see
+    build_consolidate_amount), so balances computed under the other mode never match.
+    """
+    return sys.intern(f"{subsidiary}:{department}:{location}:{class_id}:{int(single_subsidiary)}")
+
+# In-memory cache for slow-changing endpoint responses (/test)
+# Structure: { 'endpoint_key': (timestamp, serialized_json_bytes) }
+# Stores the already-serialized body so cache hits skip the JSON encoding too
+response_cache = {}
+RESPONSE_CACHE_TTL = 300  # 5 minutes in seconds
+
+
+# Serialized /lookups/all body - built once after the lookup cache loads, since
+# the dropdown data only changes when the cache is reloaded (None = not built yet)
+# Structure: (json_bytes, gzip_bytes, etag, built_at) - one tuple so readers never see a mismatched set
+lookups_payload = None
+LOOKUPS_PAYLOAD_TTL = disk_cache.LOOKUP_TTL  # same lifetime as the lookup snapshot
+lookups_payload_lock = threading.Lock()
+
+
+def get_cached_response(key):
+    """Return a cached JSON Response for key, or None if missing/expired"""
+    entry = response_cache.get(key)
+    if entry and (time.time() - entry[0]) < RESPONSE_CACHE_TTL:
+        return Response(entry[1], mimetype='application/json')
+    return None
+
+
+def cache_response(key, payload):
+    """Serialize payload once, store it under key, and return it as a Response"""
+    body = app.json.dumps(payload).encode('utf-8')
+    response_cache[key] = (time.time(), body)
+    return Response(body, mimetype='application/json')
+
+# Short-lived cache of raw SuiteQL results to absorb Excel recalc duplicates
+# Structure: { blake2b(sql_query) digest: items_list } (errors are never cached)
+QUERY_RESULT_CACHE_TTL = 60  # 1 minute in seconds
+query_result_cache = TTLCache(maxsize=5000, ttl=QUERY_RESULT_CACHE_TTL)
 
 # In-memory cache for fiscal year lookups (to avoid repeated API calls)
 # Structure: { 'period_name': {fiscal_year_id, fy_start, fy_end, period_id, period_start, period_end} }
@@ -74,9 +295,13 @@ bs_activity_cache_timestamp = None
 # Structure: { 'account_number': True }
 bs_account_set = set()
 
-# In-memory cache for account titles (permanent, rarely changes)
+# In-memory cache for account titles (permanent, rarely changes - LRU bounded)
 # Structure: { 'account_number': 'account_name' }
-account_title_cache = {}
+account_title_cache = TTLCache(maxsize=10_000)
+
+# Account number → (internal id, accttype) for per-cell balance queries (LRU bounded)
+# Structure: { 'account_number': ('id', 'accttype') }
+account_info_cache = TTLCache(maxsize=10_000, ttl=disk_cache.LOOKUP_TTL)
 
 # Default subsidiary ID (top-level parent) - loaded at startup
 # This is used when no subsidiary is specified by the user
@@ -87,10 +312,25 @@ default_subsidiary_id = None
 # Primary book is ID 1 in NetSuite
 DEFAULT_ACCOUNTING_BOOK = 1
 
+# Warm start: restore persisted caches from disk (see disk_cache.py)
+# Period dates and account titles are effectively permanent (24h TTL),
+# balances honor BALANCE_CACHE_TTL
+_period_dates, _ = disk_cache.load_namespace('period_dates', disk_cache.LOOKUP_TTL)
+lookup_cache['periods'].update({k: tuple(v) for k, v in _period_dates.items()})
+account_title_cache.update(disk_cache.load_namespace('account_title', disk_cache.LOOKUP_TTL)[0])
+_balances, _ = disk_cache.load_namespace('balance', BALANCE_CACHE_TTL)
+for _key, _entry in _balances.items():
+    # Entries are stored as [value, expires_at] - keep each one's original expiry
+    # rather than granting a fresh TTL on restart (rows without one are skipped)
+    if isinstance(_entry, list) and len(_entry) == 2 and _entry[1] is not None:
+        _remaining = _entry[1] - time.time()
+        if _remaining > 0:
+            balance_cache.set(_key, _entry[0], ttl=_remaining)
+
 # Load NetSuite configuration
 try:
-    with open('netsuite_config.json', 'r') as f:
-        config = json.load(f)
+    with open('netsuite_config.json', 'rb') as f:
+        config = json_loads(f.read())
 except FileNotFoundError:
     print("ERROR: netsuite_config.json not found!")
     print("Please create netsuite_config.json with your NetSuite credentials.")
@@ -109,47 +349,111 @@ auth = OAuth1(
     signature_method='HMAC-SHA256'
 )
 
+# Shared HTTP session - keeps TLS connections to NetSuite alive between queries
+# so each call doesn't pay a fresh handshake (~100-300ms)
+# The transport only retries failed connects (the request never reached NetSuite).
+# urllib3 would resend the already-signed request, and NetSuite rejects a reused
+# OAuth nonce, so 429/5xx are retried in post_suiteql, which re-signs each attempt.
+netsuite_retry = Retry(
+    total=3,
+    connect=3,
+    read=0,
+    status=0,
+    backoff_factor=0.3,
+    status_forcelist=[],
+    allowed_methods=None,  # connect retries apply to POST too
+    raise_on_status=False
+)
+netsuite_session = requests.Session()
+netsuite_session.auth = auth
+netsuite_session.headers.update({
+    'Content-Type': 'application/json',
+    'Prefer': 'transient',
+    'Connection': 'keep-alive',
+    'Accept-Encoding': 'gzip, deflate'  # BS results are highly repetitive JSON; requests decompresses transparently
+})
+netsuite_session.mount('https://', HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=netsuite_retry))
+
+
+# Transient NetSuite statuses retried by post_suiteql (SuiteQL POSTs are read-only)
+NETSUITE_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+NETSUITE_MAX_RETRIES = 3
+NETSUITE_RETRY_BACKOFF = 0.3  # seconds, doubled per attempt
+
+
+def post_suiteql(url, sql_query, timeout):
+    """
+    POST one SuiteQL request through the shared session, within NetSuite's limits.
+    
+    Every NetSuite call goes through here so the semaphore caps concurrent requests
+    at NETSUITE_CONCURRENCY_LIMIT (including paginated fan-outs) and requests are
+    spaced at least MIN_REQUEST_INTERVAL apart.
+    
+    429/5xx responses are retried up to NETSUITE_MAX_RETRIES times with exponential
+    backoff. Each attempt is a new session.post, so OAuth1 signs it with a fresh
+    nonce and timestamp. The semaphore is released while backing off.
+    
+    Returns:
+        The final requests.Response (any status); raises on connection errors
+    """
+    global last_netsuite_request_time
+    
+    for attempt in range(NETSUITE_MAX_RETRIES + 1):
+        with netsuite_semaphore:
+            with netsuite_request_lock:
+                elapsed = time.time() - last_netsuite_request_time
+                if elapsed < MIN_REQUEST_INTERVAL:
+                    time.sleep(MIN_REQUEST_INTERVAL - elapsed)
+                last_netsuite_request_time = time.time()
+            
+            response = netsuite_session.post(url, json={'q': sql_query}, timeout=timeout)
+        
+        if response.status_code not in NETSUITE_RETRY_STATUSES or attempt == NETSUITE_MAX_RETRIES:
+            return response
+        
+        delay = NETSUITE_RETRY_BACKOFF * (2 ** attempt)
+        print(f"⚠️ NetSuite {response.status_code} - retrying in {delay:.1f}s "
+              f"(attempt {attempt + 1}/{NETSUITE_MAX_RETRIES})", file=sys.stderr)
+        time.sleep(delay)
+
 
-def query_netsuite(sql_query, timeout=30):
+def query_netsuite(sql_query, timeout=30, use_cache=True):
     """Execute a SuiteQL query against NetSuite
     
     Args:
         sql_query: The SuiteQL query to execute
         timeout: Request timeout in seconds (default 30, increase for complex BS queries)
+        use_cache: Serve identical queries from query_result_cache for QUERY_RESULT_CACHE_TTL
     """
-    global last_netsuite_request_time
+    cache_key = hashlib.blake2b(sql_query.encode('utf-8'), digest_size=16).digest()
+    if use_cache:
+        cached = query_result_cache.get(cache_key)
+        if cached is not None:
+            # Fresh row dicts - callers mutate rows (batch_key pop, drill-down links)
+            return [dict(row) for row in cached]
     
-    # Rate limiting: acquire semaphore and enforce minimum interval
-    with netsuite_semaphore:
-        with netsuite_request_lock:
-            elapsed = time.time() - last_netsuite_request_time
-            if elapsed < MIN_REQUEST_INTERVAL:
-                time.sleep(MIN_REQUEST_INTERVAL - elapsed)
-            last_netsuite_request_time = time.time()
-        
-        try:
-            response = requests.post(
-                suiteql_url,
-                auth=auth,
-                headers={'Content-Type': 'application/json', 'Prefer': 'transient'},
-                json={'q': sql_query},
-                timeout=timeout
-            )
+    try:
+        # Rate limiting (semaphore + minimum interval) is applied by post_suiteql
+        response = post_suiteql(suiteql_url, sql_query, timeout)
+        
+        if response.status_code == 200:
+            items = json_loads(response.content).get('items', [])
+            if use_cache:
+                query_result_cache.set(cache_key, items)
+                return [dict(row) for row in items]
+            return items
+        else:
+            error_msg = f"NetSuite error: {response.status_code}"
+            print(f"=== NetSuite Error ===", file=sys.stderr)
+            print(f"Query: {sql_query[:200]}...", file=sys.stderr)
+            print(f"Status: {response.status_code}", file=sys.stderr)
+            print(f"Response: {response.text}", file=sys.stderr)
+            print(f"=====================", file=sys.stderr)
+            return {'error': error_msg, 'details': response.text}
             
-            if response.status_code == 200:
-                return response.json().get('items', [])
-            else:
-                error_msg = f"NetSuite error: {response.status_code}"
-                print(f"=== NetSuite Error ===", file=sys.stderr)
-                print(f"Query: {sql_query[:200]}...", file=sys.stderr)
-                print(f"Status: {response.status_code}", file=sys.stderr)
-                print(f"Response: {response.text}", file=sys.stderr)
-                print(f"=====================", file=sys.stderr)
-                return {'error': error_msg, 'details': response.text}
-                
-        except Exception as e:
-            print(f"Exception querying NetSuite: {str(e)}", file=sys.stderr)
-            return {'error': str(e)}
+    except Exception as e:
+        print(f"Exception querying NetSuite: {str(e)}", file=sys.stderr)
+        return {'error': str(e)}
 
 
 def query_netsuite_paginated(sql_query, timeout=30, page_size=1000, order_by="1"):
@@ -208,11 +512,35 @@ def query_netsuite_paginated(sql_query, timeout=30, page_size=1000, order_by="1"
     return all_results
 
 
+_SQL_ESCAPE_TABLE = str.maketrans({"'": "''"})
+
+
 def escape_sql(text):
     """Escape single quotes in SQL strings"""
     if text is None:
         return ""
-    return str(text).replace("'", "''")
+    if not isinstance(text, str):
+        text = str(text)
+    if "'" not in text:
+        return text  # Fast path: account numbers and period names rarely contain quotes
+    return text.translate(_SQL_ESCAPE_TABLE)
+
+
+# Smallest padded account IN-list (see build_account_filter)
+IN_LIST_MIN_BUCKET = 8
+
+
+def sql_in_list(values):
+    """
+    Build a quoted, escaped IN-list body in canonical order.
+    
+    SuiteQL over REST has no bind variables, so the statement text is the plan
+    cache key - deduping and sorting keeps it stable across Excel call orders.
+    
+    Example:
+        sql_in_list(['Feb 2025', 'Jan 2025', 'Feb 2025']) → "'Feb 2025','Jan 2025'"
+    """
+    return ','.join(f"'{escape_sql(v)}'" for v in sorted({str(v) for v in values}))
 
 
 def build_account_filter(accounts, column='a.acctnumber'):
@@ -233,7 +561,8 @@ def build_account_filter(accounts, column='a.acctnumber'):
     
     Example:
         build_account_filter(['4010', '4020', '5*'])
-        → "(a.acctnumber IN ('4010','4020') OR a.acctnumber LIKE '5%')"
+        → "(a.acctnumber IN ('4010','4020','4020',...) OR a.acctnumber LIKE '5%')"
+        (exact matches are padded to a power-of-two count, min IN_LIST_MIN_BUCKET)
     """
     if not accounts:
         return "1=0"  # No accounts = no results
@@ -241,8 +570,9 @@ def build_account_filter(accounts, column='a.acctnumber'):
     exact_matches = []
     wildcard_patterns = []
     
-    for acc in accounts:
-        acc_str = str(acc).strip()
+    # Canonical (deduped, sorted) order so the same account set always yields the
+    # same SQL text - lets NetSuite reuse its cached plan and our result cache hit
+    for acc_str in sorted({str(acc).strip() for acc in accounts}):
         if '*' in acc_str:
             # Convert * to % for SQL LIKE
             pattern = escape_sql(acc_str.replace('*', '%'))
@@ -254,6 +584,10 @@ def build_account_filter(accounts, column='a.acctnumber'):
     clauses = []
     
     if exact_matches:
+        # Pad to a power-of-two bucket (repeating the last value - no effect on results)
+        # so the statement shape only changes at 8/16/32/... accounts, not per count
+        bucket = max(IN_LIST_MIN_BUCKET, 1 << (len(exact_matches) - 1).bit_length())
+        exact_matches += [exact_matches[-1]] * (bucket - len(exact_matches))
         clauses.append(f"{column} IN ({','.join(exact_matches)})")
     
     if wildcard_patterns:
@@ -265,6 +599,30 @@ def build_account_filter(accounts, column='a.acctnumber'):
         return f"({' OR '.join(clauses)})"
 
 
+def get_account_info(account_number):
+    """
+    Resolve an exact account number to its internal id and type (cached).
+    
+    Returns:
+        (id, accttype) tuple, or (None, None) if the account doesn't exist.
+        Raises RuntimeError if the lookup itself failed (so callers can tell the two apart).
+    """
+    info = account_info_cache.get(account_number)
+    if info is not None:
+        return info
+    
+    result = query_netsuite(
+        f"SELECT id, accttype FROM Account WHERE acctnumber = '{escape_sql(account_number)}'"
+    )
+    if isinstance(result, dict) and 'error' in result:
+        raise RuntimeError(result['error'])
+    if isinstance(result, list) and len(result) > 0:
+        info = (str(result[0].get('id')), result[0].get('accttype', ''))
+        account_info_cache.set(account_number, info)
+        return info
+    return (None, None)
+
+
 def is_balance_sheet_account(accttype):
     """
     Determine if an account type is a Balance Sheet account.
@@ -282,17 +640,22 @@ def is_balance_sheet_account(accttype):
     return AccountType.is_balance_sheet(accttype)
 
 
+# Month name ↔ number lookups (built once, shared by the period helpers)
+_MONTH_MAP = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
+}
+_MONTH_NAMES = ('', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+                'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+# 'Jan' ↔ '01' (used for period column aliases like p_2025_01 / bal_2025_01)
+_MONTH_TO_NUM_STR = {name: f"{i:02d}" for i, name in enumerate(_MONTH_NAMES) if name}
+_NUM_STR_TO_MONTH = {num: name for name, num in _MONTH_TO_NUM_STR.items()}
+
+
 def calculate_period_end_date(period_name):
     """Calculate the end date of a period from its name (e.g., 'Jan 2025' -> '01/31/2025')
     Used as a fallback when the period doesn't exist in NetSuite's AccountingPeriod table
     """
-    import calendar
-    
-    month_map = {
-        'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
-        'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
-    }
-    
     try:
         parts = period_name.strip().split()
         if len(parts) != 2:
@@ -300,7 +663,7 @@ def calculate_period_end_date(period_name):
         
         month_str = parts[0].lower()[:3]
         year = int(parts[1])
-        month = month_map.get(month_str)
+        month = _MONTH_MAP.get(month_str)
         
         if not month:
             return None
@@ -349,8 +712,9 @@ def get_period_dates_from_name(period_name):
     
     # Check cache first
     cache_key = f"{period_name}_dates"
-    if cache_key in lookup_cache['periods']:
-        return lookup_cache['periods'][cache_key]
+    cached = lookup_cache['periods'].get(cache_key)  # single get - /cache/clear may empty it concurrently
+    if cached is not None:
+        return cached
     
     try:
         query = f"""
@@ -366,6 +730,7 @@ def get_period_dates_from_name(period_name):
             dates = (result[0].get('startdate'), result[0].get('enddate'), result[0].get('id'))
             # Cache it
             lookup_cache['periods'][cache_key] = dates
+            disk_cache.put('period_dates', cache_key, dates)
             print(f"DEBUG: Found period '{period_name}' -> {dates}", file=sys.stderr)
             return dates
         print(f"DEBUG: Period '{period_name}' NOT found in NetSuite AccountingPeriod table", file=sys.stderr)
@@ -375,10 +740,67 @@ def get_period_dates_from_name(period_name):
         return (None, None, None)
 
 
+def get_period_dates_bulk(period_names):
+    """Resolve dates for many periods with ONE AccountingPeriod query (avoids N+1 lookups)
+    
+    Populates the same cache as get_period_dates_from_name, so follow-up per-period
+    calls are served from memory.
+    
+    Returns:
+        dict of period_name → (startdate, enddate, id) for the periods found
+    """
+    # Only query names that aren't year-only and aren't cached yet
+    missing = []
+    for name in dict.fromkeys(period_names):
+        if name and not is_year_only(name) and f"{name}_dates" not in lookup_cache['periods']:
+            missing.append(name)
+    
+    if missing:
+        in_list = ', '.join(f"'{escape_sql(name)}'" for name in missing)
+        query = f"""
+            SELECT periodname, startdate, enddate, id
+            FROM AccountingPeriod
+            WHERE periodname IN ({in_list})
+            AND isquarter = 'F'
+            AND isyear = 'F'
+        """
+        try:
+            result = query_netsuite(query)
+            if isinstance(result, list):
+                found = {}
+                for row in result:
+                    cache_key = f"{row.get('periodname')}_dates"
+                    # Keep the first match per name (same as ROWNUM = 1 in the single lookup)
+                    if cache_key not in found:
+                        found[cache_key] = (row.get('startdate'), row.get('enddate'), row.get('id'))
+                lookup_cache['periods'].update(found)
+                disk_cache.put_many('period_dates', found)
+                print(f"DEBUG: Bulk-loaded {len(found)}/{len(missing)} periods in one query", file=sys.stderr)
+        except Exception as e:
+            print(f"Error bulk-loading period dates: {e}", file=sys.stderr)
+    
+    periods = lookup_cache['periods']
+    resolved = {name: periods.get(f"{name}_dates") for name in period_names}
+    return {name: dates for name, dates in resolved.items() if dates is not None}
+
+
+@lru_cache(maxsize=512)
+def parse_ns_date(date_str):
+    """
+    Parse a NetSuite M/D/YYYY date (e.g., "1/31/2025") into a datetime.
+    
+    Hand-split instead of strptime (regex-based, slow) since the format is fixed;
+    raises ValueError on anything else, like strptime would.
+    """
+    month, day, year = date_str.split('/')
+    return datetime(int(year), int(month), int(day))
+
+
 def get_months_between_periods(from_period, to_period):
     """Calculate the number of months between two periods
     Returns number of months, or 0 if calculation fails"""
     try:
+        get_period_dates_bulk([from_period, to_period])  # one round-trip for both ends
         from_dates = get_period_dates_from_name(from_period)
         to_dates = get_period_dates_from_name(to_period)
         from_start = from_dates[0] if from_dates else None
@@ -388,8 +810,8 @@ def get_months_between_periods(from_period, to_period):
             return 0
         
         # Parse dates (NetSuite returns dates like "1/1/2025")
-        start = date_parser.parse(from_start)
-        end = date_parser.parse(to_end)
+        start = parse_ns_date(from_start)
+        end = parse_ns_date(to_end)
         
         # Calculate months difference
         months = (end.year - start.year) * 12 + (end.month - start.month) + 1
@@ -399,82 +821,53 @@ def get_months_between_periods(from_period, to_period):
         return 0
 
 
-def generate_quarterly_chunks(from_period, to_period):
-    """Break a large date range into quarterly chunks
-    Returns list of (from_period, to_period) tuples"""
-    
-    # Map month names to numbers
-    month_map = {
-        'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
-        'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
-    }
-    
+@lru_cache(maxsize=256)
+def _quarterly_chunks(from_period, to_period):
+    """Cached worker for generate_quarterly_chunks (returns an immutable tuple)"""
     try:
         # Parse "Jan 2025" format
         from_parts = from_period.split()
         to_parts = to_period.split()
         
         if len(from_parts) != 2 or len(to_parts) != 2:
-            return [(from_period, to_period)]  # Return original if parsing fails
+            return ((from_period, to_period),)  # Return original if parsing fails
         
-        from_month = month_map.get(from_parts[0].lower()[:3])
-        from_year = int(from_parts[1])
-        to_month = month_map.get(to_parts[0].lower()[:3])
-        to_year = int(to_parts[1])
+        from_month = _MONTH_MAP.get(from_parts[0].lower()[:3])
+        to_month = _MONTH_MAP.get(to_parts[0].lower()[:3])
         
         if not from_month or not to_month:
-            return [(from_period, to_period)]
+            return ((from_period, to_period),)
         
-        # Generate quarters (3-month chunks)
-        chunks = []
-        current_month = from_month
-        current_year = from_year
+        # Month ordinals (year*12 + month-1) turn the wrap-around logic into plain integer math
+        from_ord = int(from_parts[1]) * 12 + from_month - 1
+        to_ord = int(to_parts[1]) * 12 + to_month - 1
         
-        while (current_year < to_year) or (current_year == to_year and current_month <= to_month):
-            # Calculate chunk end (current + 2 months, or to_month if sooner)
-            chunk_end_month = min(current_month + 2, 12)
-            chunk_end_year = current_year
-            
-            # Don't exceed the target end date
-            if chunk_end_year > to_year or (chunk_end_year == to_year and chunk_end_month > to_month):
-                chunk_end_month = to_month
-                chunk_end_year = to_year
-            
-            # Convert back to period names
-            month_names = ['', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
-                          'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-            chunk_from = f"{month_names[current_month]} {current_year}"
-            chunk_to = f"{month_names[chunk_end_month]} {chunk_end_year}"
-            
-            chunks.append((chunk_from, chunk_to))
-            
-            # Move to next quarter
-            current_month = chunk_end_month + 1
-            if current_month > 12:
-                current_month = 1
-                current_year += 1
-            
-            # Safety: prevent infinite loops
-            if len(chunks) > 20:
-                break
+        def fmt(o):
+            return f"{_MONTH_NAMES[o % 12 + 1]} {o // 12}"
+        
+        # Generate quarters (3-month chunks) - a chunk never crosses a year boundary
+        chunks = []
+        start = from_ord
+        while start <= to_ord:
+            end = min(start + 2, to_ord, start - start % 12 + 11)
+            chunks.append((fmt(start), fmt(end)))
+            start = end + 1
         
-        return chunks if chunks else [(from_period, to_period)]
+        return tuple(chunks) if chunks else ((from_period, to_period),)
         
     except Exception as e:
         print(f"Error generating chunks: {e}", file=sys.stderr)
-        return [(from_period, to_period)]  # Return original on error
+        return ((from_period, to_period),)  # Return original on error
 
 
-def load_lookup_cache():
-    """Load all name-to-ID mappings into memory cache"""
-    global cache_loaded
-    
-    if cache_loaded:
-        return
-    
-    print("Loading name-to-ID lookup cache...")
-    
-    # Load Departments directly from Department table
+def generate_quarterly_chunks(from_period, to_period):
+    """Break a large date range into quarterly chunks
+    Returns list of (from_period, to_period) tuples"""
+    return list(_quarterly_chunks(from_period, to_period))
+
+
+def _load_departments():
+    """Load Departments directly from Department table"""
     try:
         dept_query = """
             SELECT id, name, fullName, isinactive 
@@ -494,8 +887,10 @@ def load_lookup_cache():
             print(f"✓ Loaded {len(dept_result)} departments")
     except Exception as e:
         print(f"✗ Department lookup error: {e}")
-    
-    # Load Classes directly from Classification table
+
+
+def _load_classes():
+    """Load Classes directly from Classification table"""
     try:
         class_query = """
             SELECT id, name, fullName, isinactive 
@@ -515,8 +910,10 @@ def load_lookup_cache():
             print(f"✓ Loaded {len(class_result)} classes")
     except Exception as e:
         print(f"✗ Class lookup error: {e}")
-    
-    # Load Locations directly from Location table
+
+
+def _load_locations():
+    """Load Locations directly from Location table"""
     try:
         loc_query = """
             SELECT id, name, fullName, isinactive 
@@ -536,9 +933,14 @@ def load_lookup_cache():
             print(f"✓ Loaded {len(loc_result)} locations")
     except Exception as e:
         print(f"✗ Location lookup error: {e}")
+
+
+def _load_subsidiaries():
+    """
+    Load Subsidiaries (plus currency symbol for formatting)
     
-    # Subsidiaries - now we have access to the Subsidiary table!
-    # Also load currency for each subsidiary for formatting
+    Returns: True if loaded from NetSuite, False if fallback values were used
+    """
     try:
         sub_query = """
             SELECT 
@@ -579,13 +981,39 @@ def load_lookup_cache():
                 lookup_cache['currencies'][sub_id] = currency_symbol or '$'
                 
             print(f"✓ Loaded {len(lookup_cache['subsidiaries'])} subsidiaries with currencies")
+            return True
     except Exception as e:
         print(f"✗ Subsidiary lookup error: {e}")
         # Fallback to known values
         lookup_cache['subsidiaries'] = {'parent company': '1'}
-    
-    # Load Budget Categories - critical for batch budget endpoint performance
-    # Without this, every batch budget call queries NetSuite for category ID → 429 errors
+    return False
+
+
+def _load_subsidiary_hierarchy():
+    """Subsidiary hierarchy for the /lookups/all dropdown - built once here instead of per request"""
+    try:
+        hierarchy_query = """
+            SELECT id, name, parent
+            FROM Subsidiary
+            WHERE isinactive = 'F'
+        """
+        hierarchy_result = query_netsuite(hierarchy_query)
+        if isinstance(hierarchy_result, list):
+            # Sorted here rather than in SuiteQL (case-insensitively, like its ORDER BY) -
+            # rows are sorted before "(Consolidated)" entries are interleaved after their parents
+            lookup_cache['subsidiaries_enriched'] = build_subsidiary_dropdown(
+                sorted(hierarchy_result, key=lambda row: (row['name'] or '').lower())
+            )
+            print(f"✓ Built subsidiary hierarchy ({len(lookup_cache['subsidiaries_enriched'])} entries)")
+    except Exception as e:
+        print(f"✗ Subsidiary hierarchy error: {e}")
+
+
+def _load_budget_categories():
+    """
+    Load Budget Categories - critical for batch budget endpoint performance
+    Without this, every batch budget call queries NetSuite for category ID → 429 errors
+    """
     try:
         cat_query = """
             SELECT id, name
@@ -602,15 +1030,157 @@ def load_lookup_cache():
             print(f"✓ Loaded {len(cat_result)} budget categories")
     except Exception as e:
         print(f"✗ Budget category lookup error: {e}")
+
+
+def _load_recent_periods(years=3):
+    """
+    Preload AccountingPeriod dates for the last few fiscal years in ONE query
+    Fills the same cache as get_period_dates_from_name, so per-period lookups in
+    batch_balance / full-year refresh become dict hits instead of NetSuite round-trips
+    """
+    try:
+        first_year = datetime.now().year - (years - 1)
+        period_query = f"""
+            SELECT periodname, startdate, enddate, id
+            FROM AccountingPeriod
+            WHERE isquarter = 'F'
+              AND isyear = 'F'
+              AND startdate >= TO_DATE('{first_year}-01-01', 'YYYY-MM-DD')
+            ORDER BY startdate
+        """
+        period_result = query_netsuite(period_query)
+        if isinstance(period_result, list):
+            found = {}
+            for row in period_result:
+                cache_key = f"{row.get('periodname')}_dates"
+                # Keep the first match per name (same as ROWNUM = 1 in the single lookup)
+                if cache_key not in found:
+                    found[cache_key] = (row.get('startdate'), row.get('enddate'), row.get('id'))
+            lookup_cache['periods'].update(found)
+            disk_cache.put_many('period_dates', found)
+            print(f"✓ Preloaded {len(found)} accounting periods (since {first_year})")
+    except Exception as e:
+        print(f"✗ Accounting period preload error: {e}")
+
+
+def load_lookup_cache():
+    """Load all name-to-ID mappings into memory cache (once, even under concurrent requests)"""
+    # Double-checked locking: fast path without the lock once loaded, and only
+    # the first of several concurrent callers actually queries NetSuite
+    if cache_loaded:
+        return
     
-    # Find top-level parent subsidiary (where parent IS NULL)
-    # This is used as default when no subsidiary is specified
-    load_default_subsidiary()
+    with lookup_cache_lock:
+        if cache_loaded:
+            return
+        _load_lookup_cache()
+
+
+def _load_lookup_cache():
+    """Populate lookup_cache from the disk snapshot or NetSuite (caller holds lookup_cache_lock)"""
+    global cache_loaded, default_subsidiary_id, single_subsidiary
+    
+    # Warm start: restore from disk if a fresh snapshot exists (skips all queries below)
+    snapshot = disk_cache.get('lookup', 'lookup_cache', disk_cache.LOOKUP_TTL)
+    if snapshot:
+        lookup_cache.update(snapshot['cache'])
+        default_subsidiary_id = snapshot.get('default_subsidiary_id')
+        single_subsidiary = len(lookup_cache['currencies']) == 1
+        cache_loaded = True
+        print("✓ Lookup cache restored from disk")
+        return
+    
+    print("Loading name-to-ID lookup cache...")
+    
+    # PARALLEL: the lookups are independent round-trips, so overlap them instead of
+    # paying ~8 sequential RTTs. Each loader writes its own lookup_cache key.
+    # query_netsuite's semaphore still caps concurrency at NETSUITE_CONCURRENCY_LIMIT.
+    # load_default_subsidiary finds the top-level parent (default when no subsidiary given)
+    loaders = [
+        _load_departments, _load_classes, _load_locations, _load_subsidiaries,
+        _load_subsidiary_hierarchy, _load_budget_categories, _load_recent_periods,
+        load_default_subsidiary
+    ]
+    with ThreadPoolExecutor(max_workers=len(loaders)) as executor:
+        futures = {executor.submit(loader): loader for loader in loaders}
+        results = {futures[f]: f.result() for f in as_completed(futures)}
+    subsidiaries_loaded = results.get(_load_subsidiaries) is True
+    # currencies is keyed by subsidiary id (incl. inactive), so its size is the subsidiary count
+    single_subsidiary = subsidiaries_loaded and len(lookup_cache['currencies']) == 1
+    
+    # Persist for the next restart - only when the core lookups actually loaded
+    # (periods are persisted separately as they're resolved)
+    if subsidiaries_loaded and default_subsidiary_id:
+        disk_cache.put('lookup', 'lookup_cache', {
+            'cache': {k: v for k, v in lookup_cache.items() if k != 'periods'},
+            'default_subsidiary_id': default_subsidiary_id
+        })
     
     cache_loaded = True
     print("✓ Lookup cache loaded!")
 
 
+def build_subsidiary_dropdown(hierarchy_result):
+    """
+    Build the subsidiary dropdown list from (id, name, parent) rows.
+    
+    Subsidiaries that are parents (have children) get an extra "(Consolidated)" entry
+    which uses BUILTIN.CONSOLIDATE to include parent + all children transactions.
+    
+    Returns:
+        list of {id, name, parent, depth[, isConsolidated]} dicts
+    """
+    # One pass over the rows: sub_id → [name, parent_id, is_parent]. A parent seen
+    # before its own row gets a placeholder entry whose name is filled in later;
+    # placeholders that never get a row (e.g. inactive parents) are not emitted.
+    all_subs = {}
+    order = []
+    for row in hierarchy_result:
+        sub_id = str(row['id'])
+        parent = row.get('parent')
+        parent_id = str(parent) if parent else None
+        entry = all_subs.setdefault(sub_id, [None, None, False])
+        entry[0] = row['name']
+        entry[1] = parent_id
+        order.append(sub_id)
+        if parent_id:
+            all_subs.setdefault(parent_id, [None, None, False])[2] = True
+    
+    # Depth = number of ancestors; memoized so shared ancestors are walked once
+    depths = {}
+    
+    def get_depth(sub_id):
+        if sub_id in depths:
+            return depths[sub_id]
+        parent_id = all_subs[sub_id][1]
+        depth = get_depth(parent_id) + 1 if parent_id in all_subs else 0
+        depths[sub_id] = depth
+        return depth
+    
+    # Add all subsidiaries (in query order) with hierarchy info
+    subsidiaries = []
+    for sub_id in order:
+        name, parent_id, is_parent = all_subs[sub_id]
+        depth = get_depth(sub_id)
+        subsidiaries.append({
+            'id': sub_id,
+            'name': name,
+            'parent': parent_id,
+            'depth': depth
+        })
+        
+        # If this is a parent, also add "(Consolidated)" version
+        if is_parent:
+            subsidiaries.append({
+                'id': sub_id,  # Same ID, BUILTIN.CONSOLIDATE handles consolidation
+                'name': f"{name} (Consolidated)",
+                'parent': parent_id,
+                'depth': depth,
+                'isConsolidated': True
+            })
+    return subsidiaries
+
+
 def load_default_subsidiary():
     """
     Find the top-level parent subsidiary (where parent IS NULL)
@@ -831,6 +1401,15 @@ def get_subsidiaries_in_hierarchy(target_sub_id):
         return [target_id]  # Fallback to just the target
 
 
+# Dimension type → lookup_cache key (handle 'class' → 'classes')
+DIMENSION_CACHE_KEYS = {
+    'subsidiary': 'subsidiaries',
+    'department': 'departments',
+    'class': 'classes',  # NOT 'classs'!
+    'location': 'locations'
+}
+
+
 def convert_name_to_id(dimension_type, value):
     """
     Convert a dimension name to its ID
@@ -858,23 +1437,14 @@ def convert_name_to_id(dimension_type, value):
     # The "(Consolidated)" version uses the SAME subsidiary ID - it just affects
     # how BUILTIN.CONSOLIDATE handles child transactions
     if dimension_type == 'subsidiary' and value_lower.endswith(' (consolidated)'):
-        value_lower = value_lower.replace(' (consolidated)', '')
-        print(f"   Stripped '(Consolidated)' suffix → looking up '{value_lower}'")
-    
-    # Map dimension type to cache key (handle 'class' → 'classes')
-    cache_key_map = {
-        'subsidiary': 'subsidiaries',
-        'department': 'departments',
-        'class': 'classes',  # NOT 'classs'!
-        'location': 'locations'
-    }
-    cache_key = cache_key_map.get(dimension_type, dimension_type + 's')
+        value_lower = value_lower[:-len(' (consolidated)')]
+    
+    cache_key = DIMENSION_CACHE_KEYS.get(dimension_type, dimension_type + 's')
     
-    if cache_key in lookup_cache:
-        if value_lower in lookup_cache[cache_key]:
-            found_id = lookup_cache[cache_key][value_lower]
-            print(f"✓ Converted {dimension_type} '{value}' → ID {found_id}")
-            return found_id
+    # Plain dict hit - runs 4× per balance/budget request, so no logging on success
+    found_id = lookup_cache.get(cache_key, {}).get(value_lower)
+    if found_id is not None:
+        return found_id
     
     # Not found - return EMPTY to prevent SQL errors
     # (better to ignore the filter than break the query)
@@ -882,6 +1452,25 @@ def convert_name_to_id(dimension_type, value):
     return ''
 
 
+def resolve_dimension_filters(source):
+    """
+    Read subsidiary/class/department/location from a request mapping (request.args,
+    a JSON body or one batch entry) and convert names to IDs in one pass.
+    
+    Returns:
+        (raw_subsidiary, subsidiary, class_id, department, location) - raw_subsidiary is
+        kept for should_use_consolidated; IDs are '' when unset or not found
+    """
+    raw_subsidiary = source.get('subsidiary', '') or ''
+    return (
+        raw_subsidiary,
+        convert_name_to_id('subsidiary', raw_subsidiary),
+        convert_name_to_id('class', source.get('class', '')),
+        convert_name_to_id('department', source.get('department', '')),
+        convert_name_to_id('location', source.get('location', ''))
+    )
+
+
 @app.route('/')
 def home():
     """Health check endpoint"""
@@ -905,6 +1494,45 @@ def health():
     return jsonify({'status': 'healthy', 'account': account_id})
 
 
+@app.route('/cache/stats')
+def cache_stats():
+    """Hit/miss counters and sizes for the in-memory caches (for TTL/size tuning)"""
+    return jsonify({
+        'balance_cache': balance_cache.stats(),
+        'account_title_cache': account_title_cache.stats(),
+        'account_info_cache': account_info_cache.stats(),
+        'query_result_cache': query_result_cache.stats()
+    })
+
+
+@app.route('/cache/clear', methods=['POST'])
+def cache_clear():
+    """
+    Drop cached query results, balances, account/period metadata and endpoint
+    responses, in memory and on disk (forces fresh NetSuite data).
+    
+    The name→ID lookup_cache (subsidiaries, departments, ...) is kept - it is only
+    reloaded on restart.
+    """
+    global budget_unavailable_until, lookups_payload
+    query_result_cache.clear()
+    balance_cache.clear()
+    bs_activity_cache.clear()
+    response_cache.clear()
+    # Account numbers → ids/types/titles and period name → dates (renamed or
+    # renumbered accounts would otherwise stay stale for up to LOOKUP_TTL)
+    account_info_cache.clear()
+    account_title_cache.clear()
+    lookup_cache['periods'].clear()
+    fiscal_year_cache.clear()
+    lookups_payload = None  # rebuilt on the next /lookups/all
+    budget_unavailable_until = 0.0  # re-probe budgets on the next request
+    for namespace in ('balance', 'pl_rollup', 'account_title', 'period_dates'):
+        disk_cache.replace_namespace(namespace, {})
+    print("🗑️ Caches cleared via /cache/clear", file=sys.stderr)
+    return jsonify({'status': 'cleared'})
+
+
 @app.route('/debug/budget-schema')
 def debug_budget_schema():
     """
@@ -1224,6 +1852,25 @@ def check_permissions():
     return jsonify(results)
 
 
+@app.route('/admin/refresh_subs_count', methods=['POST'])
+def admin_refresh_subs_count():
+    """
+    Re-count subsidiaries after one is added in NetSuite (rare).
+    Query builders skip BUILTIN.CONSOLIDATE while the account has a single subsidiary.
+    """
+    global single_subsidiary
+    
+    result = query_netsuite("SELECT COUNT(*) AS subs_count FROM Subsidiary", use_cache=False)
+    if isinstance(result, dict) and 'error' in result:
+        return jsonify(result), 500
+    
+    subs_count = int(result[0]['subs_count']) if result else 0
+    single_subsidiary = subs_count == 1
+    print(f"🔄 Subsidiary count refreshed: {subs_count} (single_subsidiary={single_subsidiary})", file=sys.stderr)
+    
+    return jsonify({'subs_count': subs_count, 'single_subsidiary': single_subsidiary})
+
+
 @app.route('/admin/restart', methods=['POST'])
 def admin_restart():
     """
@@ -1248,6 +1895,18 @@ def admin_restart():
     })
 
 
+# NetSuite account type mapping for better matching in /accounts/search
+# Map common user inputs to actual NetSuite type values
+ACCOUNT_SEARCH_TYPE_MAPPINGS = {
+    'INCOME': ('Income', 'OthIncome'),
+    'EXPENSE': ('Expense', 'OthExpense'),
+    'COGS': ('COGS', 'Cost of Goods Sold'),
+    'ASSET': ('Bank', 'AcctRec', 'OthCurrAsset', 'FixedAsset', 'OthAsset', 'DeferExpense', 'Unbilled'),
+    'LIABILITY': ('AcctPay', 'CreditCard', 'OthCurrLiab', 'LongTermLiab', 'DeferRevenue'),
+    'EQUITY': ('Equity',)
+}
+
+
 @app.route('/accounts/search', methods=['GET'])
 def search_accounts():
     """
@@ -1288,22 +1947,11 @@ def search_accounts():
             sql_pattern = pattern.replace('*', '%').upper()
             sql_pattern = escape_sql(sql_pattern)
             
-            # NetSuite account type mapping for better matching
-            # Map common user inputs to actual NetSuite type values
-            type_mappings = {
-                'INCOME': ['Income', 'OthIncome'],
-                'EXPENSE': ['Expense', 'OthExpense'],
-                'COGS': ['COGS', 'Cost of Goods Sold'],
-                'ASSET': ['Bank', 'AcctRec', 'OthCurrAsset', 'FixedAsset', 'OthAsset', 'DeferExpense', 'Unbilled'],
-                'LIABILITY': ['AcctPay', 'CreditCard', 'OthCurrLiab', 'LongTermLiab', 'DeferRevenue'],
-                'EQUITY': ['Equity']
-            }
-            
-            # Check if pattern matches a category
+            # Check if pattern matches a category (see ACCOUNT_SEARCH_TYPE_MAPPINGS)
             pattern_upper = pattern_without_wildcards.upper()
             matched_types = []
             
-            for category, types in type_mappings.items():
+            for category, types in ACCOUNT_SEARCH_TYPE_MAPPINGS.items():
                 if category.startswith(pattern_upper) or pattern_upper in category:
                     matched_types.extend(types)
             
@@ -1335,10 +1983,11 @@ def search_accounts():
         # Build SuiteQL query
         # Use accountsearchdisplaynamecopy for clean name (without number prefix)
         # sspecacct = Special Account Type (e.g., Retained Earnings, Unbilled Receivable)
+        # Columns are aliased to the response field names so rows are returned as-is
         query = f"""
             SELECT 
                 id,
-                acctnumber,
+                acctnumber AS accountnumber,
                 accountsearchdisplaynamecopy AS accountname,
                 accttype,
                 sspecacct
@@ -1357,16 +2006,14 @@ def search_accounts():
         if isinstance(result, dict) and 'error' in result:
             return jsonify(result), 500
         
-        # Format response
-        accounts = []
-        for row in result:
-            accounts.append({
-                'id': row.get('id'),
-                'accountnumber': row.get('acctnumber'),
-                'accountname': row.get('accountname'),
-                'accttype': row.get('accttype'),
-                'sspecacct': row.get('sspecacct') or ''  # Special Account Type
-            })
+        # Format response in place - SuiteQL omits NULL columns and adds a 'links' key
+        accounts = result
+        for row in accounts:
+            row.pop('links', None)
+            # Every response field is always present (None when NULL), as before
+            for column in ('id', 'accountnumber', 'accountname', 'accttype'):
+                row.setdefault(column, None)
+            row['sspecacct'] = row.get('sspecacct') or ''  # Special Account Type
         
         return jsonify({
             'pattern': pattern,
@@ -1405,8 +2052,8 @@ def get_accounts_with_activity():
         
         from datetime import datetime
         try:
-            start_date = datetime.strptime(start_date_str, '%m/%d/%Y')
-            end_date = datetime.strptime(end_date_str, '%m/%d/%Y')
+            start_date = parse_ns_date(start_date_str)
+            end_date = parse_ns_date(end_date_str)
             start_sql = start_date.strftime('%Y-%m-%d')
             end_sql = end_date.strftime('%Y-%m-%d')
         except ValueError:
@@ -1599,7 +2246,7 @@ def get_accounts_by_type():
         # Convert date format
         from datetime import datetime
         try:
-            end_date = datetime.strptime(end_date_str, '%m/%d/%Y')
+            end_date = parse_ns_date(end_date_str)
             to_date_str = end_date.strftime('%Y-%m-%d')
         except ValueError:
             to_date_str = end_date_str
@@ -1640,7 +2287,7 @@ def get_accounts_by_type():
             year = to_period.split()[-1] if ' ' in to_period else to_period
             fy_start = f"01/01/{year}"
             try:
-                fy_start_date = datetime.strptime(fy_start, '%m/%d/%Y')
+                fy_start_date = parse_ns_date(fy_start)
                 from_date_str = fy_start_date.strftime('%Y-%m-%d')
             except ValueError:
                 from_date_str = f"{year}-01-01"
@@ -1709,106 +2356,112 @@ def get_accounts_by_type():
         return jsonify({'error': str(e)}), 500
 
 
-def build_pl_query(accounts, periods, base_where, target_sub, needs_line_join, accountingbook=None, 
-                   subsidiary_id=None, use_hierarchy=False):
-    """
-    Build query for P&L accounts (Income Statement)
-    P&L accounts show activity within the specific period only
-    
-    BUILTIN.CONSOLIDATE is always used - it works universally:
-    - OneWorld: Performs currency consolidation to parent subsidiary
-    - Non-OneWorld: Passes through amount unchanged
-    
-    Args:
-        accountingbook: Accounting book ID (default: Primary Book / ID 1)
-        subsidiary_id: Subsidiary ID for foreign currency check
-        use_hierarchy: True if consolidated view (skip OthExpense flip)
-    
-    SIGN CONVENTIONS:
-    - Income/OthIncome: Always flip (credit amounts to positive revenue)
-    - OthExpense on FOREIGN subsidiaries (non-consolidated): Flip to match NetSuite IS display
-    - All other expenses: No flip
-    """
-    if accountingbook is None:
-        accountingbook = DEFAULT_ACCOUNTING_BOOK
-    
-    # Build account filter (supports wildcards like '4*' for all revenue accounts)
-    account_filter = build_account_filter(accounts)
-    periods_in = ','.join([f"'{escape_sql(p)}'" for p in periods])
-    
-    # Add account and period filters
-    where_clause = f"{base_where} AND {account_filter} AND apf.periodname IN ({periods_in})"
-    
-    # Only include P&L account types (using constants)
-    where_clause += f" AND a.accttype IN ({PL_TYPES_SQL})"
-    
-    # Add accountingbook filter (Multi-Book Accounting support)
-    where_clause += f" AND tal.accountingbook = {accountingbook}"
-    
-    # Sign multiplier: flip Income/OthIncome from credits (negative) to positive display
-    sign_sql = f"* CASE WHEN a.accttype IN ({INCOME_TYPES_SQL}) THEN -1 ELSE 1 END"
-    
-    # Always use BUILTIN.CONSOLIDATE - works for both OneWorld and non-OneWorld
-    # For non-OneWorld, it simply returns the original amount unchanged
-    amount_calc = f"""TO_NUMBER(
-                                BUILTIN.CONSOLIDATE(
-                                    tal.amount,
-                                    'LEDGER',
-                                    'DEFAULT',
-                                    'DEFAULT',
-                            {target_sub or 1},
-                                    t.postingperiod,
-                                    'DEFAULT'
-                                )
-                    )"""
-    
-    if needs_line_join:
-        return f"""
+# Line-level join - only needed when filtering by department/class/location
+_TL_JOIN_SQL = "JOIN TransactionLine tl ON t.id = tl.transaction AND tal.transactionline = tl.id"
+
+# P&L activity per account × period (filled in by build_pl_query)
+_PL_QUERY_TEMPLATE = """
             SELECT 
                 a.acctnumber,
+                a.accttype,
                 ap.periodname,
                 SUM(cons_amt) AS balance
             FROM (
                 SELECT
                     tal.account,
                     t.postingperiod,
-                    {amount_calc}
-                    {sign_sql}
- AS cons_amt
+                    {amount_calc} AS cons_amt
                 FROM TransactionAccountingLine tal
                     JOIN Transaction t ON t.id = tal.transaction
-                    JOIN TransactionLine tl ON t.id = tl.transaction AND tal.transactionline = tl.id
+                    {line_join}
                     JOIN Account a ON a.id = tal.account
                     JOIN AccountingPeriod apf ON apf.id = t.postingperiod
                 WHERE {where_clause}
             ) x
             JOIN Account a ON a.id = x.account
             JOIN AccountingPeriod ap ON ap.id = x.postingperiod
-            GROUP BY a.acctnumber, ap.periodname
+            GROUP BY a.acctnumber, a.accttype, ap.periodname
         """
-    else:
-        return f"""
-            SELECT 
-                a.acctnumber,
-                ap.periodname,
-                SUM(cons_amt) AS balance
-            FROM (
-                SELECT
-                    tal.account,
-                    t.postingperiod,
-                    {amount_calc}
-                    {sign_sql}
- AS cons_amt
+
+# Cumulative BS balance per account for one period (build_bs_query_single_period)
+_BS_PERIOD_QUERY_TEMPLATE = """
+                SELECT 
+                    a.acctnumber,
+                    SUM({amount_calc}) AS balance
                 FROM TransactionAccountingLine tal
                     JOIN Transaction t ON t.id = tal.transaction
+                    {line_join}
                     JOIN Account a ON a.id = tal.account
-                    JOIN AccountingPeriod apf ON apf.id = t.postingperiod
                 WHERE {where_clause}
-            ) x
-            JOIN Account a ON a.id = x.account
-            JOIN AccountingPeriod ap ON ap.id = x.postingperiod
-            GROUP BY a.acctnumber, ap.periodname
-        """
+                GROUP BY a.acctnumber
+            """
+
+
+def build_pl_query(accounts, periods, base_where, target_sub, needs_line_join, accountingbook=None, 
+                   subsidiary_id=None, use_hierarchy=False):
+    """
+    Build query for P&L accounts (Income Statement)
+    P&L accounts show activity within the specific period only
+    
+    BUILTIN.CONSOLIDATE is always used - it works universally:
+    - OneWorld: Performs currency consolidation to parent subsidiary
+    - Non-OneWorld: Passes through amount unchanged
+    
+    Args:
+        accountingbook: Accounting book ID (default: Primary Book / ID 1)
+        subsidiary_id: Subsidiary ID for foreign currency check
+        use_hierarchy: True if consolidated view (skip OthExpense flip)
+    
+    SIGN CONVENTIONS:
+    - Income/OthIncome: Always flip (credit amounts to positive revenue) - applied
+      once per aggregated row by pl_row_balance, not per transaction line in SQL
+    - OthExpense on FOREIGN subsidiaries (non-consolidated): Flip to match NetSuite IS display
+    - All other expenses: No flip
+    """
+    if accountingbook is None:
+        accountingbook = DEFAULT_ACCOUNTING_BOOK
+    
+    # Build account filter (supports wildcards like '4*' for all revenue accounts)
+    account_filter = build_account_filter(accounts)
+    periods_in = sql_in_list(periods)
+    
+    # Add account and period filters
+    where_clause = f"{base_where} AND {account_filter} AND apf.periodname IN ({periods_in})"
+    
+    # Only include P&L account types (using constants)
+    where_clause += f" AND a.accttype IN ({PL_TYPES_SQL})"
+    
+    # Add accountingbook filter (Multi-Book Accounting support)
+    where_clause += f" AND tal.accountingbook = {accountingbook}"
+    # Zero lines can't change the SUM - skip them before the (expensive) CONSOLIDATE
+    where_clause += " AND tal.amount <> 0"
+    
+    # BUILTIN.CONSOLIDATE to the target subsidiary (specialized away for single-subsidiary accounts)
+    amount_calc = build_consolidate_amount(target_sub, 't.postingperiod')
+    
+    return _PL_QUERY_TEMPLATE.format(
+        amount_calc=amount_calc,
+        line_join=_TL_JOIN_SQL if needs_line_join else '',
+        where_clause=where_clause
+    )
+
+
+def pl_row_balance(row):
+    """
+    Display balance for a build_pl_query result row.
+    
+    Income/OthIncome are stored as credits (negative) - flip to positive revenue.
+    Done here on the SUM rather than as a per-line CASE inside the query.
+    """
+    balance = float(row['balance']) if row['balance'] else 0
+    if AccountType.is_income(row.get('accttype')):
+        balance = -balance
+    return balance
+
+
+# Maximum periods pivoted into one single-pass Balance Sheet query (build_bs_query)
+# (each period adds a CONSOLIDATE column - keeps SuiteQL text length reasonable)
+BS_PIVOT_MAX_PERIODS = 12
 
 
 def build_bs_query_single_period(accounts, period_name, period_info, base_where, target_sub, needs_line_join, accountingbook=None):
@@ -1838,7 +2491,7 @@ def build_bs_query_single_period(accounts, period_name, period_info, base_where,
     
     # Parse enddate
     try:
-        end_date_obj = datetime.strptime(enddate, '%m/%d/%Y')
+        end_date_obj = parse_ns_date(enddate)
         end_date_str = end_date_obj.strftime('%Y-%m-%d')
     except:
         end_date_str = enddate
@@ -1850,49 +2503,23 @@ def build_bs_query_single_period(accounts, period_name, period_info, base_where,
     # CUMULATIVE: All transactions through period end (no lower bound)
     where_clause += f" AND t.trandate <= TO_DATE('{end_date_str}', 'YYYY-MM-DD')"
     where_clause += f" AND tal.accountingbook = {accountingbook}"
+    # Zero lines can't change the SUM - skip them before the (expensive) CONSOLIDATE
+    where_clause += " AND tal.amount <> 0"
     
-    # Always use BUILTIN.CONSOLIDATE - works for both OneWorld and non-OneWorld
+    # BUILTIN.CONSOLIDATE (specialized away for single-subsidiary accounts)
     # For BS, we use the target period_id for exchange rate (not posting period)
     if period_id:
-        amount_calc = f"""TO_NUMBER(
-                                    BUILTIN.CONSOLIDATE(
-                                        tal.amount,
-                                        'LEDGER',
-                                        'DEFAULT',
-                                        'DEFAULT',
-                                {target_sub or 1},
-                                        {period_id},
-                                        'DEFAULT'
-                                    )
-                        )"""
+        amount_calc = build_consolidate_amount(target_sub, period_id)
     else:
         # Fallback for periods not in NetSuite's AccountingPeriod table
         print(f"WARNING: Using non-consolidated amounts for BS query (period_id={period_id})", file=sys.stderr)
         amount_calc = "tal.amount"
     
-    if needs_line_join:
-        return f"""
-            SELECT 
-                a.acctnumber,
-                SUM({amount_calc}) AS balance
-            FROM TransactionAccountingLine tal
-                JOIN Transaction t ON t.id = tal.transaction
-                JOIN TransactionLine tl ON t.id = tl.transaction AND tal.transactionline = tl.id
-                JOIN Account a ON a.id = tal.account
-            WHERE {where_clause}
-            GROUP BY a.acctnumber
-        """
-    else:
-        return f"""
-            SELECT 
-                a.acctnumber,
-                SUM({amount_calc}) AS balance
-            FROM TransactionAccountingLine tal
-                JOIN Transaction t ON t.id = tal.transaction
-                JOIN Account a ON a.id = tal.account
-            WHERE {where_clause}
-            GROUP BY a.acctnumber
-        """
+    return _BS_PERIOD_QUERY_TEMPLATE.format(
+        amount_calc=amount_calc,
+        line_join=_TL_JOIN_SQL if needs_line_join else '',
+        where_clause=where_clause
+    )
 
 
 def build_bs_query(accounts, period_info, base_where, target_sub, needs_line_join, accountingbook=None):
@@ -1900,113 +2527,71 @@ def build_bs_query(accounts, period_info, base_where, target_sub, needs_line_joi
     Build query for Balance Sheet accounts (Assets/Liabilities/Equity)
     Balance Sheet accounts show CUMULATIVE balance from inception through period end
     
-    Key difference: For each period, use t.trandate <= period.enddate
-    Returns row-based output (like P&L) - one row per account per period
-    
-    BUILTIN.CONSOLIDATE is always used - it works universally:
-    - OneWorld: Performs currency consolidation to parent subsidiary
-    - Non-OneWorld: Passes through amount unchanged
+    Single pass with conditional aggregation: transactions are scanned ONCE up to
+    the latest period end, and each period gets its own
+    SUM(CASE WHEN t.trandate <= period_end THEN amount ELSE 0 END) column
+    (instead of one UNION ALL branch - and one full scan - per period).
     
-    Performance optimization: 
-    1. Query ONE period at a time (UNION ALL)
-    2. Limit to fiscal year scope (not ALL history) to avoid timeouts
+    BUILTIN.CONSOLIDATE uses each period's own id for the exchange rate, so
+    every column still consolidates at its period-end rate.
     
     Args:
+        period_info: { period_name: {'id', 'enddate', ...} } - all periods need an id
         accountingbook: Accounting book ID (default: Primary Book / ID 1)
-    """
-    from datetime import datetime
-    from dateutil.relativedelta import relativedelta
     
+    Returns:
+        SQL returning one row per account: acctnumber, bal_0 .. bal_N-1
+        (bal_i is the balance for the i-th period in period_info order)
+    """
     if accountingbook is None:
         accountingbook = DEFAULT_ACCOUNTING_BOOK
     
     # Build account filter (supports wildcards like '4*')
     account_filter = build_account_filter(accounts)
     
-    # Find the earliest period to determine fiscal year start
-    earliest_enddate = min([info['enddate'] for info in period_info.values()])
-    try:
-        earliest_date = datetime.strptime(earliest_enddate, '%m/%d/%Y')
-        # Get fiscal year start (January 1 of that year)
-        fiscal_year_start = datetime(earliest_date.year, 1, 1)
-        min_date_str = fiscal_year_start.strftime('%Y-%m-%d')
-        print(f"DEBUG - BS query using fiscal year start: {min_date_str}", file=sys.stderr)
-    except Exception as e:
-        # Fallback: 1 year back
-        min_date_str = '2024-01-01'
-        print(f"DEBUG - BS query using fallback date: {min_date_str} (error: {e})", file=sys.stderr)
-    
-    union_queries = []
+    balance_columns = []
+    end_dates = []
     
-    for period, info in period_info.items():
-        enddate = info['enddate']
-        period_id = info['id']
-        
+    for i, info in enumerate(period_info.values()):
         # Parse enddate
         try:
-            end_date_obj = datetime.strptime(enddate, '%m/%d/%Y')
-            end_date_str = end_date_obj.strftime('%Y-%m-%d')
+            end_date_str = parse_ns_date(info['enddate']).strftime('%Y-%m-%d')
         except:
-            end_date_str = enddate
-        
-        # Build WHERE clause for this period (account_filter supports wildcards)
-        period_where = f"{base_where} AND {account_filter}"
-        # Exclude P&L types - Balance Sheet only (using constants)
-        period_where += f" AND a.accttype NOT IN ({PL_TYPES_SQL})"
-        # CRITICAL: Balance Sheet is CUMULATIVE - ALL transactions through period end (like user's reference)
-        # No lower bound to get true cumulative balance
-        period_where += f" AND t.trandate <= TO_DATE('{end_date_str}', 'YYYY-MM-DD')"
-        # Add accountingbook filter (supports Multi-Book Accounting)
-        period_where += f" AND tal.accountingbook = {accountingbook}"
+            end_date_str = info['enddate']
+        end_dates.append(end_date_str)
         
-        # Always use BUILTIN.CONSOLIDATE - works for both OneWorld and non-OneWorld
+        # BUILTIN.CONSOLIDATE (specialized away for single-subsidiary accounts)
         # For BS, we use the period_id for exchange rate (not posting period)
-        amount_calc = f"""TO_NUMBER(
-                                    BUILTIN.CONSOLIDATE(
-                                        tal.amount,
-                                        'LEDGER',
-                                        'DEFAULT',
-                                        'DEFAULT',
-                                {target_sub or 1},
-                                        {period_id},
-                                        'DEFAULT'
-                                    )
-                        )"""
-        
-        # Query for THIS period only
-        if needs_line_join:
-            period_query = f"""
-                SELECT 
-                    a.acctnumber,
-                    '{escape_sql(period)}' AS periodname,
-                    SUM({amount_calc}) AS balance
-                FROM TransactionAccountingLine tal
-                    JOIN Transaction t ON t.id = tal.transaction
-                    JOIN TransactionLine tl ON t.id = tl.transaction AND tal.transactionline = tl.id
-                    JOIN Account a ON a.id = tal.account
-                WHERE {period_where}
-                GROUP BY a.acctnumber
-            """
-        else:
-            period_query = f"""
-                SELECT 
-                    a.acctnumber,
-                    '{escape_sql(period)}' AS periodname,
-                    SUM({amount_calc}) AS balance
-                FROM TransactionAccountingLine tal
-                    JOIN Transaction t ON t.id = tal.transaction
-                    JOIN Account a ON a.id = tal.account
-                WHERE {period_where}
-                GROUP BY a.acctnumber
-            """
-        
-        union_queries.append(period_query)
+        amount_calc = build_consolidate_amount(target_sub, info['id'])
+        balance_columns.append(
+            f"SUM(CASE WHEN t.trandate <= TO_DATE('{end_date_str}', 'YYYY-MM-DD') "
+            f"THEN {amount_calc} ELSE 0 END) AS bal_{i}"
+        )
     
-    # UNION all period queries
-    full_query = " UNION ALL ".join(union_queries)
-    full_query += " ORDER BY acctnumber, periodname"
+    # Build WHERE clause (account_filter supports wildcards)
+    where_clause = f"{base_where} AND {account_filter}"
+    # Exclude P&L types - Balance Sheet only (using constants)
+    where_clause += f" AND a.accttype NOT IN ({PL_TYPES_SQL})"
+    # CRITICAL: Balance Sheet is CUMULATIVE - no lower bound; the upper bound is the
+    # latest period end (ISO strings compare chronologically)
+    where_clause += f" AND t.trandate <= TO_DATE('{max(end_dates)}', 'YYYY-MM-DD')"
+    # Add accountingbook filter (supports Multi-Book Accounting)
+    where_clause += f" AND tal.accountingbook = {accountingbook}"
+    # Zero lines can't change any SUM - skip them before the (expensive) CONSOLIDATE
+    where_clause += " AND tal.amount <> 0"
     
-    return full_query
+    balance_sql = ",\n                ".join(balance_columns)
+    return f"""
+            SELECT 
+                a.acctnumber,
+                {balance_sql}
+            FROM TransactionAccountingLine tal
+                JOIN Transaction t ON t.id = tal.transaction
+                {_TL_JOIN_SQL if needs_line_join else ''}
+                JOIN Account a ON a.id = tal.account
+            WHERE {where_clause}
+            GROUP BY a.acctnumber
+        """
 
 
 def build_bs_cumulative_balance_query(target_period_name, target_sub, filters, accountingbook=None):
@@ -2092,6 +2677,7 @@ def build_bs_cumulative_balance_query(target_period_name, target_sub, filters, a
     WHERE 
       t.posting = 'T'
       AND tal.posting = 'T'
+      AND tal.amount <> 0
       AND tal.accountingbook = {accountingbook}
       AND a.accttype NOT IN ({PL_TYPES_SQL})
       AND ap.startdate <= target_period.enddate
@@ -2170,12 +2756,6 @@ def build_bs_multi_period_query(periods, target_sub, filters, accountingbook=Non
     
     # Parse periods and build components
     # Period format: "Mon YYYY" e.g., "Jan 2025"
-    month_map = {
-        'Jan': '01', 'Feb': '02', 'Mar': '03', 'Apr': '04',
-        'May': '05', 'Jun': '06', 'Jul': '07', 'Aug': '08',
-        'Sep': '09', 'Oct': '10', 'Nov': '11', 'Dec': '12'
-    }
-    
     period_aliases = []  # e.g., ['p_2024_12', 'p_2025_01', ...]
     inner_joins = []
     select_columns = []
@@ -2192,7 +2772,7 @@ def build_bs_multi_period_query(periods, target_sub, filters, accountingbook=Non
         
         month_name = parts[0]
         year = parts[1]
-        month_num = month_map.get(month_name)
+        month_num = _MONTH_TO_NUM_STR.get(month_name)
         
         if not month_num:
             continue
@@ -2452,6 +3032,50 @@ def build_full_year_pl_query(fiscal_year, target_sub, filters, accountingbook=No
     return build_full_year_pl_query_pivoted(fiscal_year, target_sub, filters, accountingbook)
 
 
+# Pivoted full-year P&L: one row per account, one column per month (build_full_year_pl_query_pivoted)
+# The 12 month columns are spelled out once here instead of re-spliced on every refresh.
+# Fiscal year is filtered as a plain startdate range (not TO_CHAR(startdate) = year)
+# so the predicate stays sargable and NetSuite can use the period date index.
+_PL_PIVOTED_MONTH_COLUMNS = ('jan', 'feb', 'mar', 'apr', 'may', 'jun',
+                             'jul', 'aug', 'sep', 'oct', 'nov', 'dec_month')  # 'dec' might be reserved
+_PL_PIVOTED_QUERY_TEMPLATE = """
+    SELECT
+      a.acctnumber AS account_number,
+      a.accttype AS account_type,
+""" + ",\n".join(
+    f"      SUM(CASE WHEN TO_CHAR(ap.startdate,'YYYY-MM')='{{fiscal_year}}-{month:02d}' THEN cons_amt ELSE 0 END) AS {col}"
+    for month, col in enumerate(_PL_PIVOTED_MONTH_COLUMNS, start=1)
+) + """
+    FROM (
+      SELECT
+        tal.account,
+        t.postingperiod,
+        {amount_calc}
+        {sign_sql}
+        AS cons_amt
+      FROM transactionaccountingline tal
+        JOIN transaction t ON t.id = tal.transaction
+        {line_join}
+        JOIN account a ON a.id = tal.account
+        JOIN accountingperiod apf ON apf.id = t.postingperiod
+      WHERE t.posting = 'T'
+        AND tal.posting = 'T'
+        AND tal.amount <> 0
+        AND tal.accountingbook = {accountingbook}
+        AND apf.isyear = 'F' 
+        AND apf.isquarter = 'F'
+        AND apf.startdate >= TO_DATE('{fiscal_year}-01-01', 'YYYY-MM-DD')
+        AND apf.startdate < TO_DATE('{next_year}-01-01', 'YYYY-MM-DD')
+        AND a.accttype IN (""" + PL_TYPES_SQL + """)
+        {filter_sql}
+    ) x
+    JOIN accountingperiod ap ON ap.id = x.postingperiod
+    JOIN account a ON a.id = x.account
+    GROUP BY a.acctnumber, a.accttype
+    ORDER BY a.acctnumber
+    """
+
+
 def build_full_year_pl_query_pivoted(fiscal_year, target_sub, filters, accountingbook=None):
     """
     OPTIMIZED full-year P&L query using PIVOTED columns for all 12 months.
@@ -2506,67 +3130,21 @@ def build_full_year_pl_query_pivoted(fiscal_year, target_sub, filters, accountin
     filter_sql = (" AND " + " AND ".join(filter_clauses)) if filter_clauses else ""
     
     # Add TransactionLine join if filtering by class/department/location/subsidiary
-    line_join = "JOIN transactionline tl ON t.id = tl.transaction AND tal.transactionline = tl.id" if needs_line_join else ""
+    line_join = _TL_JOIN_SQL if needs_line_join else ""
     
     # Sign multiplier: flip Income/OthIncome from credits (negative) to positive display
     sign_sql = f"* CASE WHEN a.accttype IN ({INCOME_TYPES_SQL}) THEN -1 ELSE 1 END"
     
-    # Build the pivoted query with all 12 months as columns
-    # Always use BUILTIN.CONSOLIDATE - works for both OneWorld and non-OneWorld
-    query = f"""
-    SELECT
-      a.acctnumber AS account_number,
-      a.accttype AS account_type,
-      SUM(CASE WHEN TO_CHAR(ap.startdate,'YYYY-MM')='{fiscal_year}-01' THEN cons_amt ELSE 0 END) AS jan,
-      SUM(CASE WHEN TO_CHAR(ap.startdate,'YYYY-MM')='{fiscal_year}-02' THEN cons_amt ELSE 0 END) AS feb,
-      SUM(CASE WHEN TO_CHAR(ap.startdate,'YYYY-MM')='{fiscal_year}-03' THEN cons_amt ELSE 0 END) AS mar,
-      SUM(CASE WHEN TO_CHAR(ap.startdate,'YYYY-MM')='{fiscal_year}-04' THEN cons_amt ELSE 0 END) AS apr,
-      SUM(CASE WHEN TO_CHAR(ap.startdate,'YYYY-MM')='{fiscal_year}-05' THEN cons_amt ELSE 0 END) AS may,
-      SUM(CASE WHEN TO_CHAR(ap.startdate,'YYYY-MM')='{fiscal_year}-06' THEN cons_amt ELSE 0 END) AS jun,
-      SUM(CASE WHEN TO_CHAR(ap.startdate,'YYYY-MM')='{fiscal_year}-07' THEN cons_amt ELSE 0 END) AS jul,
-      SUM(CASE WHEN TO_CHAR(ap.startdate,'YYYY-MM')='{fiscal_year}-08' THEN cons_amt ELSE 0 END) AS aug,
-      SUM(CASE WHEN TO_CHAR(ap.startdate,'YYYY-MM')='{fiscal_year}-09' THEN cons_amt ELSE 0 END) AS sep,
-      SUM(CASE WHEN TO_CHAR(ap.startdate,'YYYY-MM')='{fiscal_year}-10' THEN cons_amt ELSE 0 END) AS oct,
-      SUM(CASE WHEN TO_CHAR(ap.startdate,'YYYY-MM')='{fiscal_year}-11' THEN cons_amt ELSE 0 END) AS nov,
-      SUM(CASE WHEN TO_CHAR(ap.startdate,'YYYY-MM')='{fiscal_year}-12' THEN cons_amt ELSE 0 END) AS dec_month
-    FROM (
-      SELECT
-        tal.account,
-        t.postingperiod,
-            TO_NUMBER(
-              BUILTIN.CONSOLIDATE(
-                tal.amount,
-                'LEDGER',
-                'DEFAULT',
-                'DEFAULT',
-            {target_sub or 1},
-                t.postingperiod,
-                'DEFAULT'
-              )
-            )
-        {sign_sql}
-        AS cons_amt
-      FROM transactionaccountingline tal
-        JOIN transaction t ON t.id = tal.transaction
-        {line_join}
-        JOIN account a ON a.id = tal.account
-        JOIN accountingperiod apf ON apf.id = t.postingperiod
-      WHERE t.posting = 'T'
-        AND tal.posting = 'T'
-        AND tal.accountingbook = {accountingbook}
-        AND apf.isyear = 'F' 
-        AND apf.isquarter = 'F'
-        AND TO_CHAR(apf.startdate,'YYYY') = '{fiscal_year}'
-        AND a.accttype IN ({PL_TYPES_SQL})
-        {filter_sql}
-    ) x
-    JOIN accountingperiod ap ON ap.id = x.postingperiod
-    JOIN account a ON a.id = x.account
-    GROUP BY a.acctnumber, a.accttype
-    ORDER BY a.acctnumber
-    """
-    
-    return query
+    # Fill the pivoted template (BUILTIN.CONSOLIDATE is specialized away for single-subsidiary accounts)
+    return _PL_PIVOTED_QUERY_TEMPLATE.format(
+        fiscal_year=fiscal_year,
+        next_year=int(fiscal_year) + 1,
+        amount_calc=build_consolidate_amount(target_sub, 't.postingperiod'),
+        sign_sql=sign_sql,
+        line_join=line_join,
+        accountingbook=accountingbook,
+        filter_sql=filter_sql
+    )
 
 
 def run_paginated_suiteql(base_query, page_size=1000, max_pages=20, timeout=120):
@@ -2585,7 +3163,18 @@ def run_paginated_suiteql(base_query, page_size=1000, max_pages=20, timeout=120)
     Returns:
         List of all rows from all pages
     """
-    all_rows = []
+    return list(iter_suiteql_rows(base_query, page_size, max_pages, timeout))
+
+
+def iter_suiteql_rows(base_query, page_size=1000, max_pages=20, timeout=120):
+    """
+    Generator form of run_paginated_suiteql - yields rows page by page.
+    
+    Callers that only aggregate rows can process each page as it arrives
+    instead of holding every page of a large BS result in memory at once.
+    Raises on a NetSuite error, like run_paginated_suiteql.
+    """
+    total_rows = 0
     offset = 0
     page_num = 0
     
@@ -2596,45 +3185,72 @@ def run_paginated_suiteql(base_query, page_size=1000, max_pages=20, timeout=120)
         # Add offset to the URL: /query/v1/suiteql?offset=X&limit=Y
         paginated_url = f"{suiteql_url}?limit={page_size}&offset={offset}"
         
-        response = requests.post(
-            paginated_url,
-            auth=auth,
-            headers={'Content-Type': 'application/json', 'Prefer': 'transient'},
-            json={'q': base_query},
-            timeout=timeout
-        )
+        # Through post_suiteql so parallel BS fan-outs respect NETSUITE_CONCURRENCY_LIMIT
+        response = post_suiteql(paginated_url, base_query, timeout)
         
         if response.status_code != 200:
             print(f"❌ NetSuite error on page {page_num}: {response.status_code}", flush=True)
             print(f"   Response: {response.text[:500]}", flush=True)
             raise Exception(f"NetSuite API error: {response.status_code}")
         
-        result = response.json()
+        result = json_loads(response.content)
         rows = result.get('items', [])
+        total_rows += len(rows)
         
-        print(f"   Page {page_num}: {len(rows)} rows (total: {len(all_rows) + len(rows)})", flush=True)
+        print(f"   Page {page_num}: {len(rows)} rows (total: {total_rows})", flush=True)
         
-        all_rows.extend(rows)
+        yield from rows
         
-        # If we got fewer rows than page_size, we've reached the end
-        if len(rows) < page_size:
+        # NetSuite reports hasMore; fall back to a short page meaning we've reached the end
+        # (saves the extra empty-page round-trip when the total is a multiple of page_size)
+        if not result.get('hasMore', len(rows) >= page_size) or len(rows) < page_size:
             break
         
         offset += page_size
     
     if page_num >= max_pages:
         print(f"⚠️ Reached max page limit ({max_pages})", flush=True)
-    
-    return all_rows
 
 
+# Balance snapshots are written by one background thread - rewriting up to
+# BALANCE_CACHE_MAXSIZE rows shouldn't hold up the refresh response. Requests that
+# arrive while a write is still queued share it (it snapshots when it starts).
+balance_persist_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='balance-persist')
+balance_persist_lock = threading.Lock()
+balance_persist_queued = False
+
+
+def persist_balance_cache():
+    """Snapshot balance_cache to disk (in the background) so a restart within BALANCE_CACHE_TTL stays warm"""
+    global balance_persist_queued
+    with balance_persist_lock:
+        if balance_persist_queued:
+            return
+        balance_persist_queued = True
+    balance_persist_executor.submit(_write_balance_snapshot)
+
+
+def _write_balance_snapshot():
+    """Background half of persist_balance_cache"""
+    global balance_persist_queued
+    with balance_persist_lock:
+        balance_persist_queued = False
+    # Each entry carries its own expires_at - the row's stored_at is just the snapshot time
+    disk_cache.replace_namespace('balance', {
+        key: [value, expires_at] for key, value, expires_at in balance_cache.items_with_expiry()
+    })
+
+
+@lru_cache(maxsize=256)
 def convert_month_to_period_name(month_str):
-    """Convert 'YYYY-MM' to 'Mon YYYY' format"""
+    """Convert 'YYYY-MM' to 'Mon YYYY' format (memoized - only ~12 distinct values per refresh)"""
     try:
-        dt = datetime.strptime(month_str, '%Y-%m')
-        return dt.strftime('%b %Y')
-    except:
-        return month_str
+        year, month = month_str.split('-')
+        if len(year) == 4 and 1 <= int(month) <= 12:
+            return f"{_MONTH_NAMES[int(month)]} {year}"
+    except (AttributeError, ValueError):
+        pass
+    return month_str
 
 
 def extract_year_from_period(period_name):
@@ -2648,6 +3264,107 @@ def extract_year_from_period(period_name):
     return datetime.now().year
 
 
+# Local roll-up of pivoted full-year P&L results (SQLite, see disk_cache.py)
+# Keyed by year × target subsidiary × filters × book; expires nightly.
+# Only /admin/materialize_rollup writes it - live refreshes never do, so Excel's
+# Refresh isn't served day-old numbers it cached itself (/cache/clear empties it)
+PL_ROLLUP_TTL = 24 * 60 * 60  # 24 hours in seconds
+
+# Single-flight: concurrent refreshes for the same year × filters share one NetSuite query
+# (rollup_key → Future of the rows; removed once the leading request finishes)
+pl_rollup_inflight = {}
+pl_rollup_inflight_lock = threading.Lock()
+PL_ROLLUP_WAIT_TIMEOUT = 310  # seconds a follower waits for the leader's query
+
+
+def fetch_pl_rollup(fiscal_year, target_sub, filters, accountingbook, refresh=False, materialize=False):
+    """
+    Get pivoted full-year P&L rows (build_full_year_pl_query_pivoted), from the
+    materialized roll-up when fresh, otherwise live from NetSuite.
+    
+    Args:
+        refresh: True to bypass the roll-up and re-query NetSuite
+        materialize: True to store the live result in the roll-up (admin rebuild only)
+    
+    Concurrent calls for the same year × filters are coalesced: only the first
+    queries NetSuite, the rest wait (up to PL_ROLLUP_WAIT_TIMEOUT) for its rows.
+    
+    Returns:
+        List of rows (one per account). Raises on NetSuite error, like run_paginated_suiteql.
+    """
+    # single_subsidiary changes the generated SQL, so it's part of the key too
+    rollup_key = json.dumps([str(fiscal_year), str(target_sub), filters, int(accountingbook),
+                             single_subsidiary], sort_keys=True)
+    
+    if not refresh:
+        items = disk_cache.get('pl_rollup', rollup_key, PL_ROLLUP_TTL)
+        if items is not None:
+            print(f"⚡ P&L roll-up hit for {fiscal_year} ({len(items)} accounts)", flush=True)
+            return items
+    
+    # Join an identical query that's already running instead of firing a second one
+    with pl_rollup_inflight_lock:
+        future = pl_rollup_inflight.get(rollup_key)
+        is_leader = future is None
+        if is_leader:
+            future = pl_rollup_inflight[rollup_key] = Future()
+    
+    if not is_leader:
+        print(f"⏳ P&L refresh for {fiscal_year} already running - waiting for its result", flush=True)
+        return future.result(timeout=PL_ROLLUP_WAIT_TIMEOUT)
+    
+    try:
+        base_query = build_full_year_pl_query_pivoted(fiscal_year, target_sub, filters, accountingbook)
+        # The pivoted query returns ~100-300 rows (one per account) so pagination is optional
+        items = run_paginated_suiteql(base_query, page_size=1000, max_pages=5, timeout=30)
+        if materialize:
+            disk_cache.put('pl_rollup', rollup_key, items)
+        future.set_result(items)
+        return items
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with pl_rollup_inflight_lock:
+            pl_rollup_inflight.pop(rollup_key, None)
+
+
+@app.route('/admin/materialize_rollup', methods=['POST'])
+def admin_materialize_rollup():
+    """
+    Rebuild the local P&L roll-up for the given fiscal years (unfiltered, default subsidiary).
+    Intended to be called nightly (e.g. cron) so the first full year refresh is instant.
+    
+    POST JSON:
+    {
+        "years": [2024, 2025],  // Optional - defaults to current year
+        "accountingbook": 1     // Optional - defaults to Primary Book
+    }
+    """
+    data = request.get_json() or {}
+    # Both values end up in SQL and the roll-up key - accept integers only
+    try:
+        years = [int(year) for year in (data.get('years') or [datetime.now().year])]
+        accountingbook = int(data.get('accountingbook') or DEFAULT_ACCOUNTING_BOOK)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'years and accountingbook must be integers'}), 400
+    
+    load_lookup_cache()
+    target_sub = default_subsidiary_id or '1'
+    disk_cache.purge_expired('pl_rollup', PL_ROLLUP_TTL)
+    
+    materialized = {}
+    for year in years:
+        try:
+            items = fetch_pl_rollup(year, target_sub, {}, accountingbook, refresh=True, materialize=True)
+            materialized[str(year)] = len(items)
+        except Exception as e:
+            print(f"❌ Roll-up failed for {year}: {e}", file=sys.stderr)
+            materialized[str(year)] = {'error': str(e)}
+    
+    return jsonify({'status': 'ok', 'accounts_per_year': materialized})
+
+
 @app.route('/batch/full_year_refresh', methods=['POST'])
 def batch_full_year_refresh():
     """
@@ -2662,7 +3379,8 @@ def batch_full_year_refresh():
         "subsidiary": "",
         "class": "",
         "department": "",
-        "location": ""
+        "location": "",
+        "refresh": false  // Optional - true bypasses the local P&L roll-up
     }
     
     Returns:
@@ -2749,26 +3467,28 @@ def batch_full_year_refresh():
         print(f"   use_hierarchy={filters.get('use_hierarchy', False)}", file=sys.stderr)
     
     # DEBUG: Query sspecacct values for 80xxx and 89xxx accounts
-    try:
-        debug_query = """
-        SELECT acctnumber, accttype, sspecacct 
-        FROM account 
-        WHERE acctnumber LIKE '80%' OR acctnumber LIKE '89%'
-        ORDER BY acctnumber
-        """
-        debug_result = query_netsuite(debug_query)
-        if isinstance(debug_result, list):
-            print(f"   DEBUG sspecacct values for 80xxx/89xxx accounts:", file=sys.stderr)
-            for item in debug_result:
-                acct = item.get('acctnumber', '')
-                atype = item.get('accttype', '')
-                sspec = item.get('sspecacct', '')
-                is_matching = 'YES' if sspec and str(sspec).startswith('Matching') else 'NO'
-                print(f"     {acct}: type={atype}, sspecacct='{sspec}', isMatching={is_matching}", file=sys.stderr)
-        else:
-            print(f"   DEBUG query returned: {debug_result}", file=sys.stderr)
-    except Exception as e:
-        print(f"   DEBUG query failed: {e}", file=sys.stderr)
+    # (an extra NetSuite round-trip - only in debug mode)
+    if app.debug:
+        try:
+            debug_query = """
+            SELECT acctnumber, accttype, sspecacct 
+            FROM account 
+            WHERE acctnumber LIKE '80%' OR acctnumber LIKE '89%'
+            ORDER BY acctnumber
+            """
+            debug_result = query_netsuite(debug_query)
+            if isinstance(debug_result, list):
+                app.logger.debug("sspecacct values for 80xxx/89xxx accounts:")
+                for item in debug_result:
+                    acct = item.get('acctnumber', '')
+                    atype = item.get('accttype', '')
+                    sspec = item.get('sspecacct', '')
+                    is_matching = 'YES' if sspec and str(sspec).startswith('Matching') else 'NO'
+                    app.logger.debug("  %s: type=%s, sspecacct='%s', isMatching=%s", acct, atype, sspec, is_matching)
+            else:
+                app.logger.debug("sspecacct query returned: %s", debug_result)
+        except Exception as e:
+            app.logger.debug("sspecacct query failed: %s", e)
     
     try:
         print(f"\n{'='*80}", flush=True)
@@ -2777,15 +3497,13 @@ def batch_full_year_refresh():
         print(f"   Filters: {filters}", flush=True)
         print(f"{'='*80}\n", flush=True)
         
-        # Build the OPTIMIZED PIVOTED query (one row per account, 12 month columns)
-        base_query = build_full_year_pl_query_pivoted(fiscal_year, target_sub, filters, accountingbook)
-        
-        # Execute query - no pagination needed since one row per account!
+        # OPTIMIZED PIVOTED query (one row per account, 12 month columns),
+        # served from the local roll-up when this year × filter combo was materialized recently
         start_time = datetime.now()
         
         try:
-            # The pivoted query returns ~100-300 rows (one per account) so pagination is optional
-            items = run_paginated_suiteql(base_query, page_size=1000, max_pages=5, timeout=30)
+            items = fetch_pl_rollup(fiscal_year, target_sub, filters, accountingbook,
+                                    refresh=bool(data.get('refresh', False)))
         except Exception as e:
             print(f"❌ Query error: {e}", flush=True)
             return jsonify({'error': f'NetSuite query failed: {str(e)}'}), 500
@@ -2822,48 +3540,39 @@ def batch_full_year_refresh():
             if not account:
                 continue
                 
-            balances[account] = {}
             account_types[account] = acct_type
             
             # Extract each month's value from the pivoted columns
-            for col_name, period_name in month_mapping.items():
-                amount = row.get(col_name)
-                if amount is not None:
-                    balances[account][period_name] = float(amount)
-                else:
-                    # SuiteQL may not return column if all values are 0
-                    balances[account][period_name] = 0.0
+            # (SuiteQL may not return a column if all values are 0)
+            balances[account] = {
+                period_name: float(row.get(col_name) or 0)
+                for col_name, period_name in month_mapping.items()
+            }
             
             # DEBUG: Log 80xxx and 89xxx accounts to diagnose sign issues
-            if account.startswith('80') or account.startswith('89'):
+            if account.startswith(('80', '89')):
                 feb_val = balances[account].get(f'Feb {fiscal_year}', 0)
                 if feb_val != 0:
-                    print(f"   DEBUG SIGN: acct={account}, type={acct_type}, Feb={feb_val}", file=sys.stderr)
+                    app.logger.debug("SIGN: acct=%s, type=%s, Feb=%s", account, acct_type, feb_val)
         
         print(f"📊 Returning {len(balances)} accounts × 12 months (P&L)")
         
         # CRITICAL: Cache all results in backend for fast lookups
         # This allows individual formula requests to be instant after full refresh
-        global balance_cache, balance_cache_timestamp
-        balance_cache = {}
-        balance_cache_timestamp = datetime.now()
+        balance_cache.clear()
         
-        filters_hash = f"{subsidiary}:{department}:{location}:{class_id}"
+        filters_hash = make_filters_hash(subsidiary, department, location, class_id)
         cached_count = 0
         
-        print(f"🔑 Cache key format:")
-        print(f"   subsidiary='{subsidiary}', department='{department}', location='{location}', class='{class_id}'")
-        print(f"   filters_hash='{filters_hash}' (length: {len(filters_hash)}, colons: {filters_hash.count(':')})")
+        print(f"🔑 Cache key format: '<account>:<period>:{filters_hash}'")
         
-        for account, periods_data in balances.items():
-            for period, amount in periods_data.items():
-                cache_key = f"{account}:{period}:{filters_hash}"
-                balance_cache[cache_key] = amount
-                cached_count += 1
-                
-                # Show first 3 keys as examples
-                if cached_count <= 3:
-                    print(f"   Example key #{cached_count}: '{cache_key}' (length: {len(cache_key)}, colons: {cache_key.count(':')})")
+        # Every account shares the same 12 periods - build each ':period:filters' suffix once
+        key_suffixes = {period: f":{period}:{filters_hash}" for period in month_mapping.values()}
+        cached_count += balance_cache.set_many(
+            (account + key_suffixes[period], amount)
+            for account, periods_data in balances.items()
+            for period, amount in periods_data.items()
+        )
         
         print(f"💾 Cached {cached_count} values on backend for instant formula lookups")
         print(f"{'='*80}\n")
@@ -2878,6 +3587,7 @@ def batch_full_year_refresh():
             # Use global account_title_cache for account names
             account_names_dict = {acct: account_title_cache.get(acct, '') for acct in balances.keys()}
             
+            persist_balance_cache()
             return jsonify({
                 'balances': balances,
                 'account_types': account_types,
@@ -3054,6 +3764,7 @@ def batch_full_year_refresh():
         
         print(f"{'='*80}\n")
         
+        persist_balance_cache()
         return jsonify({
             'balances': balances,
             'account_types': account_types,  # { account_number: "Income" | "Expense" | etc. }
@@ -3179,7 +3890,7 @@ def batch_periods_refresh():
         'class': class_id
     }
     # IMPORTANT: Use same format as batch_balance for cache key compatibility
-    filters_hash = f"{subsidiary}:{department}:{location}:{class_id}"
+    filters_hash = make_filters_hash(subsidiary, department, location, class_id)
     
     # Build filter clauses
     # CRITICAL: Use tl.subsidiary for GL line-level filtering (intercompany JEs have header on different sub)
@@ -3283,28 +3994,22 @@ def batch_periods_refresh():
         
         # Process P&L results - period_name is already in correct format
         for row in pl_result:
-            account = str(row.get('account_number', ''))
-            acct_type = row.get('account_type', '')
             period_name = row.get('period_name', '')  # Already "Jan 2025" format
-            amount = float(row.get('amount', 0) or 0)
-            
-            
             if not period_name or period_name not in requested_periods_set:
                 continue
             
-            if account not in balances:
-                balances[account] = {}
-            if account not in account_types:
-                account_types[account] = acct_type
-            
-            if period_name not in balances[account]:
-                balances[account][period_name] = 0
-            balances[account][period_name] += amount
+            account = str(row.get('account_number', ''))
+            account_types.setdefault(account, row.get('account_type', ''))
             
-            # Cache
-            cache_key = f"{account}:{period_name}:{filters_hash}"
-            balance_cache[cache_key] = balances[account][period_name]
-            cached_count += 1
+            account_balances = balances.setdefault(account, {})
+            account_balances[period_name] = account_balances.get(period_name, 0) + float(row.get('amount') or 0)
+        
+        # Cache the final P&L totals in one bulk write (instead of per row, under the lock each time)
+        cached_count += balance_cache.set_many(
+            (f"{account}:{period_name}:{filters_hash}", amount)
+            for account, account_balances in balances.items()
+            for period_name, amount in account_balances.items()
+        )
         
         # ========================================
         # STEP 2: BS - Query ONLY from earliest period through latest
@@ -3379,22 +4084,15 @@ def batch_periods_refresh():
         # Organize BS activity by account
         bs_activity = {}
         for row in bs_result:
-            account = str(row.get('account_number', ''))
-            acct_type = row.get('account_type', '')
             period_name = row.get('period_name', '')  # Already "Jan 2025" format
-            amount = float(row.get('amount', 0) or 0)
-            
             if not period_name:
                 continue
             
-            if account not in bs_activity:
-                bs_activity[account] = {}
-            if account not in account_types:
-                account_types[account] = acct_type
+            account = str(row.get('account_number', ''))
+            account_types.setdefault(account, row.get('account_type', ''))
             
-            if period_name not in bs_activity[account]:
-                bs_activity[account][period_name] = 0
-            bs_activity[account][period_name] += amount
+            account_activity = bs_activity.setdefault(account, {})
+            account_activity[period_name] = account_activity.get(period_name, 0) + float(row.get('amount') or 0)
         
         # Get prior period balance for BS accounts (everything before earliest period)
         prior_balances = {}
@@ -3511,6 +4209,7 @@ def batch_periods_refresh():
         print(f"   Total time: {total_elapsed:.2f} seconds")
         print(f"{'='*80}\n")
         
+        persist_balance_cache()
         return jsonify({
             'balances': balances,
             'account_types': account_types,
@@ -3601,61 +4300,64 @@ def batch_full_year_refresh_bs():
         print(f"{'='*80}\n", flush=True)
         
         start_time = datetime.now()
-        global balance_cache, balance_cache_timestamp
-        filters_hash = f"{subsidiary}:{department}:{location}:{class_id}"
+        filters_hash = make_filters_hash(subsidiary, department, location, class_id)
         
-        months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 
-                  'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+        months = _MONTH_NAMES[1:]
         
         balances = {}  # { account: { "Jan 2025": amount, ... } }
         cached_count = 0
         
-        # Process each month with a cumulative query using FIXED target period
-        for month_name in months:
-            period_name = f"{month_name} {fiscal_year}"
-            
-            print(f"   📥 Querying {period_name}...", flush=True)
-            
+        # Each month is an independent cumulative query using FIXED target period
+        def fetch_month(period_name):
             # Build the corrected query with CROSS JOIN for target period
             query = build_bs_cumulative_balance_query(period_name, target_sub, filters, accountingbook)
-            
-            try:
-                # Run the query
-                items = run_paginated_suiteql(query, page_size=1000, max_pages=20, timeout=120)
-                
-                if isinstance(items, list):
-                    for row in items:
-                        account = row.get('account_number')
-                        balance = float(row.get('balance') or 0)
-                        
-                        if not account:
-                            continue
+            return run_paginated_suiteql(query, page_size=1000, max_pages=20, timeout=120)
+        
+        # PARALLEL: overlap the 12 month round-trips instead of running them back to back
+        # (pool sized to NETSUITE_CONCURRENCY_LIMIT; post_suiteql's semaphore still caps in-flight NetSuite requests)
+        period_names = [f"{month_name} {fiscal_year}" for month_name in months]
+        print(f"   📥 Querying {len(period_names)} months in parallel...", flush=True)
+        
+        with ThreadPoolExecutor(max_workers=NETSUITE_CONCURRENCY_LIMIT) as executor:
+            futures = {executor.submit(fetch_month, name): name for name in period_names}
+            for future in as_completed(futures):
+                period_name = futures[future]
+                try:
+                    items = future.result()
+                    
+                    if isinstance(items, list):
+                        for row in items:
+                            account = row.get('account_number')
+                            balance = float(row.get('balance') or 0)
+                            
+                            if not account:
+                                continue
+                            
+                            if account not in balances:
+                                balances[account] = {}
+                            balances[account][period_name] = balance
+                            
+                            # Cache
+                            cache_key = f"{account}:{period_name}:{filters_hash}"
+                            balance_cache[cache_key] = balance
+                            cached_count += 1
                         
-                        if account not in balances:
-                            balances[account] = {}
-                        balances[account][period_name] = balance
+                        print(f"      ✅ {period_name}: {len(items)} accounts", flush=True)
+                    else:
+                        print(f"      ⚠️ {period_name}: No data or error", flush=True)
                         
-                        # Cache
-                        cache_key = f"{account}:{period_name}:{filters_hash}"
-                        balance_cache[cache_key] = balance
-                        cached_count += 1
-                    
-                    print(f"      ✅ {period_name}: {len(items)} accounts", flush=True)
-                else:
-                    print(f"      ⚠️ {period_name}: No data or error", flush=True)
-                    
-            except Exception as e:
-                print(f"      ❌ {period_name} error: {e}", flush=True)
-                # Continue with other months even if one fails
+                except Exception as e:
+                    print(f"      ❌ {period_name} error: {e}", flush=True)
+                    # Continue with other months even if one fails
         
         elapsed = (datetime.now() - start_time).total_seconds()
-        balance_cache_timestamp = datetime.now()
         
         print(f"\n⏱️  Total query time: {elapsed:.2f} seconds", flush=True)
         print(f"📊 Returning {len(balances)} BS accounts")
         print(f"💾 Cached {cached_count} BS values")
         print(f"{'='*80}\n")
         
+        persist_balance_cache()
         return jsonify({'balances': balances, 'query_time': elapsed, 'cached_count': cached_count})
         
     except Exception as e:
@@ -3748,8 +4450,7 @@ def batch_bs_periods():
         print(f"{'='*80}\n", flush=True)
         
         start_time = datetime.now()
-        global balance_cache, balance_cache_timestamp
-        filters_hash = f"{subsidiary}:{department}:{location}:{class_id}"
+        filters_hash = make_filters_hash(subsidiary, department, location, class_id)
         
         # Build the efficient multi-period query
         query = build_bs_multi_period_query(periods, target_sub, filters, accountingbook)
@@ -3760,21 +4461,12 @@ def batch_bs_periods():
         print(f"   📥 Running multi-period query...", flush=True)
         print(f"   Query (first 500 chars):\n{query[:500]}...", flush=True)
         
-        # Run the query with pagination support
-        items = run_paginated_suiteql(query, page_size=1000, max_pages=20, timeout=180)
-        
-        elapsed = (datetime.now() - start_time).total_seconds()
-        print(f"   ⏱️ Query completed in {elapsed:.1f} seconds", flush=True)
-        print(f"   ✅ Got {len(items)} accounts", flush=True)
+        # Run the query with pagination support - rows are parsed page by page as they arrive
+        items = iter_suiteql_rows(query, page_size=1000, max_pages=20, timeout=180)
         
         # Parse results
         # Column names are like bal_2024_12, bal_2025_01, etc.
-        # Need to map back to "Dec 2024", "Jan 2025", etc.
-        month_names = {
-            '01': 'Jan', '02': 'Feb', '03': 'Mar', '04': 'Apr',
-            '05': 'May', '06': 'Jun', '07': 'Jul', '08': 'Aug',
-            '09': 'Sep', '10': 'Oct', '11': 'Nov', '12': 'Dec'
-        }
+        # Need to map back to "Dec 2024", "Jan 2025", etc. (_NUM_STR_TO_MONTH)
         
         balances = {}
         cached_count = 0
@@ -3796,7 +4488,7 @@ def batch_bs_periods():
                     if len(parts) == 3:
                         year = parts[1]
                         month_num = parts[2]
-                        month_name = month_names.get(month_num)
+                        month_name = _NUM_STR_TO_MONTH.get(month_num)
                         if month_name:
                             period_name = f"{month_name} {year}"
                             balance = float(value) if value else 0
@@ -3814,13 +4506,13 @@ def batch_bs_periods():
                     balance_cache[cache_key] = balance
                     cached_count += 1
         
-        balance_cache_timestamp = datetime.now()
-        
+        elapsed = (datetime.now() - start_time).total_seconds()
         print(f"\n⏱️  Total time: {elapsed:.2f} seconds", flush=True)
         print(f"📊 Returning {len(balances)} BS accounts × {len(periods)} periods")
         print(f"💾 Cached {cached_count} BS values")
         print(f"{'='*80}\n")
         
+        persist_balance_cache()
         return jsonify({
             'balances': balances, 
             'query_time': elapsed, 
@@ -3915,7 +4607,7 @@ def batch_balance_year():
         target_sub = 1  # Parent/consolidated
     
     # Build account filter
-    account_filter = ", ".join([f"'{escape_sql(str(a))}'" for a in accounts])
+    account_filter = sql_in_list(accounts)
     
     # Sign multiplier: flip Income/OthIncome from credits (negative) to positive display
     sign_sql = f"* CASE WHEN a.accttype IN ({INCOME_TYPES_SQL}) THEN -1 ELSE 1 END"
@@ -4063,59 +4755,33 @@ def batch_balance():
     
     # Check if we can serve this request from the backend balance cache
     # (populated by full year refresh)
-    global balance_cache, balance_cache_timestamp
-    
-    if balance_cache and balance_cache_timestamp:
-        from datetime import timedelta
-        cache_age = (datetime.now() - balance_cache_timestamp).total_seconds()
-        
-        if cache_age < BALANCE_CACHE_TTL:
-            # Cache is fresh! Try to serve from cache
-            filters_hash = f"{subsidiary}:{department}:{location}:{class_id}"
-            
-            print(f"🔍 Cache lookup:")
-            print(f"   subsidiary='{subsidiary}', department='{department}', location='{location}', class='{class_id}'")
-            print(f"   Filters hash: '{filters_hash}' (length: {len(filters_hash)}, colons: {filters_hash.count(':')})")
-            print(f"   Sample accounts: {accounts[:3]}")
-            print(f"   Sample periods: {periods[:3]}")
-            print(f"   Total cached keys: {len(balance_cache)}")
-            print(f"   Sample cached keys: {list(balance_cache.keys())[:3]}")
-            
-            # Try building a sample key to compare
-            if accounts and periods:
-                sample_key = f"{accounts[0]}:{periods[0]}:{filters_hash}"
-                print(f"   Sample lookup key: '{sample_key}' (length: {len(sample_key)}, colons: {sample_key.count(':')})")
-                print(f"   Key exists in cache: {sample_key in balance_cache}")
+    # Entries expire individually (TTLCache), so no global age check is needed
+    if balance_cache:
+        # Try to serve from cache
+        filters_hash = make_filters_hash(subsidiary, department, location, class_id)
+        
+        print(f"🔍 Cache lookup: {len(accounts)} accounts × {len(periods)} periods, filters '{filters_hash}' ({len(balance_cache)} cached keys)")
+        
+        # Check if ALL requested data is in cache - one lock acquisition, stops at the first miss
+        # (keys are account-major, matching the result loop below)
+        key_suffixes = [f":{period}:{filters_hash}" for period in periods]
+        cached_values = balance_cache.get_many([
+            f"{account}{suffix}" for account in accounts for suffix in key_suffixes
+        ])
+        
+        if cached_values is not None:
+            # Serve entirely from cache!
+            print(f"⚡ BACKEND CACHE HIT: {len(accounts)} accounts × {len(periods)} periods")
             
-            # Check if ALL requested data is in cache
-            all_in_cache = True
-            missing_keys = []
-            for account in accounts:
-                for period in periods:
-                    cache_key = f"{account}:{period}:{filters_hash}"
-                    if cache_key not in balance_cache:
-                        all_in_cache = False
-                        if len(missing_keys) < 5:  # Only collect first 5 for debugging
-                            missing_keys.append(cache_key)
+            values = iter(cached_values)
+            result_balances = {
+                account: {period: next(values) for period in periods}
+                for account in accounts
+            }
             
-            if all_in_cache:
-                # Serve entirely from cache!
-                print(f"⚡ BACKEND CACHE HIT: {len(accounts)} accounts × {len(periods)} periods (age: {cache_age:.1f}s)")
-                
-                result_balances = {}
-                for account in accounts:
-                    result_balances[account] = {}
-                    for period in periods:
-                        cache_key = f"{account}:{period}:{filters_hash}"
-                        result_balances[account][period] = balance_cache.get(cache_key, 0)
-                
-                return jsonify({'balances': result_balances, 'from_cache': True})
-            else:
-                print(f"⚠️  Partial cache miss - missing keys (showing first 5):")
-                for key in missing_keys:
-                    print(f"     Missing: '{key}'")
+            return jsonify({'balances': result_balances, 'from_cache': True})
         else:
-            print(f"⚠️  Backend cache expired ({cache_age:.1f}s old) - falling back to full query")
+            print(f"⚠️  Partial cache miss - querying NetSuite")
     
     try:
         print(f"\n{'='*60}", file=sys.stderr)
@@ -4181,6 +4847,7 @@ def batch_balance():
         # Get period enddates for Balance Sheet calculation
         # Balance Sheet accounts need cumulative balance (inception through period end)
         period_info = {}
+        get_period_dates_bulk(periods)  # ONE query for all uncached periods
         for period in periods:
             start, end, period_id = get_period_dates_from_name(period)
             if end and period_id:
@@ -4240,125 +4907,170 @@ def batch_balance():
             print(f"WARNING - Account type query failed, assuming all P&L", file=sys.stderr)
             pl_accounts = accounts
         
-        print(f"DEBUG - Account type classification:", file=sys.stderr)
-        print(f"   P&L accounts ({len(pl_accounts)}): {pl_accounts}", file=sys.stderr)
-        print(f"   BS accounts ({len(bs_accounts)}): {bs_accounts}", file=sys.stderr)
-        print(f"   Types: {account_types}", file=sys.stderr)
-        
-        # Step 2: ONLY run P&L query if there are P&L accounts
-        if pl_accounts:
-            # Build WHERE clause specifically for P&L accounts (exact matches only - wildcards already expanded)
-            pl_account_filter = build_account_filter(pl_accounts)
-            pl_where_clauses = where_clauses.copy()
-            # Replace the account filter clause with just P&L accounts
-            pl_where_clauses = [c for c in pl_where_clauses if 'a.acctnumber' not in c]
-            pl_where_clauses.append(pl_account_filter)
-            pl_base_where = " AND ".join(pl_where_clauses)
+        print(f"DEBUG - Account type classification: {len(pl_accounts)} P&L, {len(bs_accounts)} BS", file=sys.stderr)
+        # Full account lists can be thousands of entries - %-args are only formatted when debug logging is on
+        app.logger.debug("P&L accounts: %s", pl_accounts)
+        app.logger.debug("BS accounts: %s", bs_accounts)
+        app.logger.debug("Types: %s", account_types)
+        
+        # PARALLEL: P&L and BS queries are independent - P&L queries are submitted
+        # here and collected after the BS step, so they overlap the BS round-trips.
+        # query_netsuite's semaphore still caps in-flight NetSuite requests.
+        with ThreadPoolExecutor(max_workers=NETSUITE_CONCURRENCY_LIMIT) as executor:
+            pl_futures = []  # [(label, future)]
             
-            # OPTIMIZATION: Split by year to avoid SuiteQL's 1000 row limit
-            # Instead of pagination (slow), run separate queries per year (faster)
-            expected_rows = len(pl_accounts) * len(periods)
-            if expected_rows > 800:
-                # Group periods by year
-                periods_by_year = {}
-                for p in periods:
-                    # Extract year from "Mon YYYY" format
-                    parts = p.split()
-                    if len(parts) == 2:
-                        year = parts[1]
-                        if year not in periods_by_year:
-                            periods_by_year[year] = []
-                        periods_by_year[year].append(p)
+            # Step 2: ONLY run P&L query if there are P&L accounts
+            if pl_accounts:
+                # Build WHERE clause specifically for P&L accounts (exact matches only - wildcards already expanded)
+                pl_account_filter = build_account_filter(pl_accounts)
+                pl_where_clauses = where_clauses.copy()
+                # Replace the account filter clause with just P&L accounts
+                pl_where_clauses = [c for c in pl_where_clauses if 'a.acctnumber' not in c]
+                pl_where_clauses.append(pl_account_filter)
+                pl_base_where = " AND ".join(pl_where_clauses)
                 
-                print(f"DEBUG - Splitting P&L query by year ({len(periods_by_year)} years) to avoid 1000 row limit", file=sys.stderr)
-                
-                # Run separate query for each year
-                for year, year_periods in periods_by_year.items():
-                    year_query = build_pl_query(pl_accounts, year_periods, pl_base_where, target_sub, needs_line_join, accountingbook,
-                                              subsidiary_id=subsidiary, use_hierarchy=wants_consolidated)
+                # OPTIMIZATION: Split by year to avoid SuiteQL's 1000 row limit
+                # Instead of pagination (slow), run separate queries per year (faster)
+                expected_rows = len(pl_accounts) * len(periods)
+                if expected_rows > 800:
+                    # Group periods by year
+                    periods_by_year = {}
+                    for p in periods:
+                        # Extract year from "Mon YYYY" format
+                        parts = p.split()
+                        if len(parts) == 2:
+                            year = parts[1]
+                            if year not in periods_by_year:
+                                periods_by_year[year] = []
+                            periods_by_year[year].append(p)
                     
-                    print(f"DEBUG - P&L Query for {year} ({len(year_periods)} periods, {len(pl_accounts)} accounts)...", file=sys.stderr)
+                    print(f"DEBUG - Splitting P&L query by year ({len(periods_by_year)} years) to avoid 1000 row limit", file=sys.stderr)
                     
-                    year_result = query_netsuite(year_query)
+                    # Run separate query for each year (in parallel)
+                    for year, year_periods in periods_by_year.items():
+                        year_query = build_pl_query(pl_accounts, year_periods, pl_base_where, target_sub, needs_line_join, accountingbook,
+                                                  subsidiary_id=subsidiary, use_hierarchy=wants_consolidated)
+                        
+                        print(f"DEBUG - P&L Query for {year} ({len(year_periods)} periods, {len(pl_accounts)} accounts)...", file=sys.stderr)
+                        
+                        pl_futures.append((year, executor.submit(query_netsuite, year_query)))
+                else:
+                    # Small query - run as single request
+                    pl_query = build_pl_query(pl_accounts, periods, pl_base_where, target_sub, needs_line_join, accountingbook,
+                                              subsidiary_id=subsidiary, use_hierarchy=wants_consolidated)
                     
-                    if isinstance(year_result, list):
-                        print(f"DEBUG - P&L {year} returned {len(year_result)} rows", file=sys.stderr)
-                        for row in year_result:
-                            account_num = row['acctnumber']
-                            period_name = row['periodname']
-                            balance = float(row['balance']) if row['balance'] else 0
-                            
-                            if account_num not in all_balances:
-                                all_balances[account_num] = {}
-                            all_balances[account_num][period_name] = balance
-                    elif isinstance(year_result, dict) and 'error' in year_result:
-                        print(f"ERROR - P&L {year} query failed: {year_result['error']}", file=sys.stderr)
+                    print(f"DEBUG - P&L Query (for {len(pl_accounts)} accounts, book={accountingbook}):\n{pl_query[:500]}...", file=sys.stderr)
+                    
+                    pl_futures.append(('all periods', executor.submit(query_netsuite, pl_query)))
             else:
-                # Small query - run as single request
-                pl_query = build_pl_query(pl_accounts, periods, pl_base_where, target_sub, needs_line_join, accountingbook,
-                                          subsidiary_id=subsidiary, use_hierarchy=wants_consolidated)
+                print(f"DEBUG - Skipping P&L query (no P&L accounts requested)", file=sys.stderr)
+            
+            # Step 3: ONLY run BS queries if there are BS accounts
+            if bs_accounts and period_info:
+                print(f"DEBUG - Querying {len(period_info)} periods for {len(bs_accounts)} Balance Sheet accounts...", file=sys.stderr)
                 
-                print(f"DEBUG - P&L Query (for {len(pl_accounts)} accounts, book={accountingbook}):\n{pl_query[:500]}...", file=sys.stderr)
+                # Build WHERE clause specifically for BS accounts (exact matches only - wildcards already expanded)
+                bs_account_filter = build_account_filter(bs_accounts)
+                bs_where_clauses = where_clauses.copy()
+                # Replace the account filter clause with just BS accounts
+                bs_where_clauses = [c for c in bs_where_clauses if 'a.acctnumber' not in c]
+                bs_where_clauses.append(bs_account_filter)
+                bs_base_where = " AND ".join(bs_where_clauses)
                 
-                pl_result = query_netsuite(pl_query)
+                # BATCHING: pivot several periods into ONE single-pass query (build_bs_query)
+                # instead of one round-trip (and one scan) per period. It returns one row per
+                # account, so it only needs to fit SuiteQL's 1000-row page limit by account count.
+                # Periods without an AccountingPeriod id keep the single-period fallback.
+                chunk_size = BS_PIVOT_MAX_PERIODS if len(bs_accounts) <= 1000 else 1
+                unionable = [(p, i) for p, i in period_info.items() if i.get('id')]
+                single = [(p, i) for p, i in period_info.items() if not i.get('id')]
                 
-                if isinstance(pl_result, list):
-                    print(f"DEBUG - P&L returned {len(pl_result)} rows", file=sys.stderr)
-                    for row in pl_result:
-                        account_num = row['acctnumber']
-                        period_name = row['periodname']
-                        balance = float(row['balance']) if row['balance'] else 0
+                period_chunks = [unionable[i:i + chunk_size] for i in range(0, len(unionable), chunk_size)]
+                if chunk_size == 1:
+                    single = unionable + single
+                    period_chunks = []
+                
+                def run_bs_chunk(chunk):
+                    """One pivot query for a chunk of periods → [(account, period, balance)], or None on failure"""
+                    chunk_names = [p for p, _ in chunk]
+                    try:
+                        chunk_query = build_bs_query(
+                            bs_accounts, dict(chunk), bs_base_where, target_sub, needs_line_join, accountingbook
+                        )
                         
-                        if account_num not in all_balances:
-                            all_balances[account_num] = {}
-                        all_balances[account_num][period_name] = balance
-        else:
-            print(f"DEBUG - Skipping P&L query (no P&L accounts requested)", file=sys.stderr)
-        
-        # Step 3: ONLY run BS queries if there are BS accounts
-        if bs_accounts and period_info:
-            print(f"DEBUG - Querying {len(period_info)} periods for {len(bs_accounts)} Balance Sheet accounts...", file=sys.stderr)
-            
-            # Build WHERE clause specifically for BS accounts (exact matches only - wildcards already expanded)
-            bs_account_filter = build_account_filter(bs_accounts)
-            bs_where_clauses = where_clauses.copy()
-            # Replace the account filter clause with just BS accounts
-            bs_where_clauses = [c for c in bs_where_clauses if 'a.acctnumber' not in c]
-            bs_where_clauses.append(bs_account_filter)
-            bs_base_where = " AND ".join(bs_where_clauses)
-            
-            for period, info in period_info.items():
-                try:
-                    # Build query for THIS period only, with BS accounts only
-                    period_query = build_bs_query_single_period(
-                        bs_accounts, period, info, bs_base_where, target_sub, needs_line_join, accountingbook
-                    )
-                    
-                    print(f"DEBUG - BS Query for {period} (book={accountingbook}):\n{period_query[:300]}...", file=sys.stderr)
-                    
-                    # Balance Sheet queries can be slower - use 90 second timeout
-                    bs_result = query_netsuite(period_query, timeout=90)
-                    
-                    if isinstance(bs_result, list):
-                        print(f"DEBUG - BS returned {len(bs_result)} rows for {period}", file=sys.stderr)
-                        # Process results for this period
-                        for row in bs_result:
-                            account_num = row['acctnumber']
-                            balance = float(row['balance']) if row['balance'] else 0
-                            
-                            if account_num not in all_balances:
-                                all_balances[account_num] = {}
-                            all_balances[account_num][period] = balance
-                    elif isinstance(bs_result, dict) and 'error' in bs_result:
-                        print(f"ERROR - BS query failed for {period}: {bs_result['error']}", file=sys.stderr)
+                        print(f"DEBUG - BS pivot query for {len(chunk)} periods {chunk_names} (book={accountingbook})", file=sys.stderr)
+                        
+                        # Balance Sheet queries can be slower - use 90 second timeout (+ more per period)
+                        bs_result = query_netsuite(chunk_query, timeout=90 + 15 * (len(chunk) - 1))
+                        
+                        if isinstance(bs_result, list):
+                            print(f"DEBUG - BS returned {len(bs_result)} accounts for {len(chunk)} periods", file=sys.stderr)
+                            # Unpivot bal_0..bal_N-1 back to (account, period, balance)
+                            return [
+                                (row['acctnumber'], period, float(row.get(f"bal_{i}") or 0))
+                                for row in bs_result
+                                for i, period in enumerate(chunk_names)
+                            ]
+                        print(f"ERROR - BS pivot query failed for {chunk_names}: {bs_result}, retrying per period", file=sys.stderr)
+                    except Exception as e:
+                        print(f"ERROR - BS pivot query exception for {chunk_names}: {str(e)}, retrying per period", file=sys.stderr)
+                    return None
+                
+                def run_bs_single(period, info):
+                    """One query for a single period → [(account, period, balance)], or [] on failure"""
+                    try:
+                        # Build query for THIS period only, with BS accounts only
+                        period_query = build_bs_query_single_period(
+                            bs_accounts, period, info, bs_base_where, target_sub, needs_line_join, accountingbook
+                        )
+                        
+                        print(f"DEBUG - BS Query for {period} (book={accountingbook}):\n{period_query[:300]}...", file=sys.stderr)
+                        
+                        # Balance Sheet queries can be slower - use 90 second timeout
+                        bs_result = query_netsuite(period_query, timeout=90)
+                        
+                        if isinstance(bs_result, list):
+                            print(f"DEBUG - BS returned {len(bs_result)} rows for {period}", file=sys.stderr)
+                            return [
+                                (row['acctnumber'], period, float(row['balance']) if row['balance'] else 0)
+                                for row in bs_result
+                            ]
+                        elif isinstance(bs_result, dict) and 'error' in bs_result:
+                            print(f"ERROR - BS query failed for {period}: {bs_result['error']}", file=sys.stderr)
+                        else:
+                            print(f"ERROR - BS query unexpected result type for {period}: {type(bs_result)}", file=sys.stderr)
+                    except Exception as e:
+                        print(f"ERROR - BS query exception for {period}: {str(e)}", file=sys.stderr)
+                    return []
+                
+                # PARALLEL: pivot chunks first (usually a single round-trip), then any
+                # single-period fallbacks, sharing the executor with the P&L queries.
+                # Results are merged here on the request thread.
+                bs_rows = []
+                for chunk, rows in zip(period_chunks, executor.map(run_bs_chunk, period_chunks)):
+                    if rows is None:
+                        single.extend(chunk)  # Fall back to one query per period for this chunk
                     else:
-                        print(f"ERROR - BS query unexpected result type for {period}: {type(bs_result)}", file=sys.stderr)
-                except Exception as e:
-                    print(f"ERROR - BS query exception for {period}: {str(e)}", file=sys.stderr)
-        else:
-            print(f"DEBUG - Skipping BS queries (no BS accounts requested)", file=sys.stderr)
+                        bs_rows.extend(rows)
+                for rows in executor.map(lambda item: run_bs_single(*item), single):
+                    bs_rows.extend(rows)
+                
+                for account_num, period, balance in bs_rows:
+                    all_balances.setdefault(account_num, {})[period] = balance
+            else:
+                print(f"DEBUG - Skipping BS queries (no BS accounts requested)", file=sys.stderr)
+            
+            # Collect the P&L results submitted in Step 2
+            for label, future in pl_futures:
+                pl_result = future.result()
+                if isinstance(pl_result, list):
+                    print(f"DEBUG - P&L {label} returned {len(pl_result)} rows", file=sys.stderr)
+                    for row in pl_result:
+                        all_balances.setdefault(row['acctnumber'], {})[row['periodname']] = pl_row_balance(row)
+                elif isinstance(pl_result, dict) and 'error' in pl_result:
+                    print(f"ERROR - P&L {label} query failed: {pl_result['error']}", file=sys.stderr)
         
-        print(f"DEBUG - Final merged balances: {list(all_balances.keys())}", file=sys.stderr)
+        print(f"DEBUG - Final merged balances: {len(all_balances)} accounts", file=sys.stderr)
         
         # WILDCARD SUPPORT: Sum results for wildcard patterns
         # The query expands "4*" to all 4xxx accounts, but we need to return a single sum
@@ -4640,6 +5352,7 @@ def preload_account_titles():
                 if account_num:
                     account_title_cache[account_num] = account_name
                     loaded_count += 1
+            disk_cache.replace_namespace('account_title', account_title_cache)
         
         print(f"✅ Preloaded {loaded_count} account titles into cache")
         return jsonify({'loaded': loaded_count, 'status': 'success'})
@@ -4754,6 +5467,7 @@ def get_account_names_batch():
                         results[miss] = 'Not Found'
                         account_title_cache[miss] = 'Not Found'  # Cache to avoid repeated queries
                 
+                disk_cache.put_many('account_title', {a: account_title_cache[a] for a in cache_misses})
                 print(f"   📝 Cached {len(found_accounts)} new titles")
         
         return jsonify(results)
@@ -4799,6 +5513,7 @@ def _get_account_name_impl(account_number):
         
         # Cache the result (even if Not Found, to avoid repeated queries)
         account_title_cache[account_number] = account_name
+        disk_cache.put('account_title', account_number, account_name)
         print(f"📝 Cached title for account {account_number}: {account_name}")
         
         return account_name
@@ -4808,6 +5523,38 @@ def _get_account_name_impl(account_number):
         return jsonify({'error': str(e)}), 500
 
 
+# Single-cell balance (get_balance): joins are assembled per request, the rest is fixed
+_BALANCE_QUERY_TEMPLATE = """
+                    SELECT SUM(x.cons_amt) AS balance
+                    FROM (
+                        SELECT
+                            {amount_calc}
+                            {sign_sql}
+                            AS cons_amt
+                        FROM TransactionAccountingLine tal
+                            {joins}
+                        WHERE {where_clause}
+                    ) x
+                """
+
+# Wildcard breakdown for get_balance: same filters, one row per matching account
+_BALANCE_BREAKDOWN_QUERY_TEMPLATE = """
+                        SELECT a.acctnumber, SUM(x.cons_amt) AS balance
+                        FROM (
+                            SELECT
+                                tal.account,
+                                {amount_calc}
+                                {sign_sql}
+                                AS cons_amt
+                            FROM TransactionAccountingLine tal
+                                {joins}
+                            WHERE {where_clause}
+                        ) x
+                        JOIN Account a ON a.id = x.account
+                        GROUP BY a.acctnumber
+                    """
+
+
 @app.route('/balance')
 def get_balance():
     """
@@ -4828,12 +5575,8 @@ def get_balance():
     try:
         # Get parameters (accept both 'from'/'to' and 'from_period'/'to_period')
         account = request.args.get('account', '')
-        raw_subsidiary = request.args.get('subsidiary', '')
         from_period = request.args.get('from_period', '') or request.args.get('from', '')
         to_period = request.args.get('to_period', '') or request.args.get('to', '')
-        class_id = request.args.get('class', '')
-        department = request.args.get('department', '')
-        location = request.args.get('location', '')
         
         # Handle year-only format (e.g., "2025" -> "Jan 2025" to "Dec 2025")
         if is_year_only(from_period):
@@ -4842,10 +5585,7 @@ def get_balance():
             _, to_period = expand_year_to_periods(to_period)
         
         # Convert names to IDs (accepts names OR IDs)
-        subsidiary = convert_name_to_id('subsidiary', raw_subsidiary)
-        class_id = convert_name_to_id('class', class_id)
-        department = convert_name_to_id('department', department)
-        location = convert_name_to_id('location', location)
+        raw_subsidiary, subsidiary, class_id, department, location = resolve_dimension_filters(request.args)
         
         # Determine consolidated status (explicit OR auto from root)
         wants_consolidated = should_use_consolidated(raw_subsidiary, subsidiary)
@@ -4862,14 +5602,18 @@ def get_balance():
         # P&L accounts need PERIOD RANGE balance (from_period through to_period)
         # ========================================================================
         is_bs_account = False
+        account_internal_id = None
         if account and not '*' in account:  # Can't auto-detect for wildcards
             try:
-                type_query = f"SELECT accttype FROM Account WHERE acctnumber = '{escape_sql(account)}'"
-                type_result = query_netsuite(type_query)
-                if isinstance(type_result, list) and len(type_result) > 0:
-                    acct_type = type_result[0].get('accttype', '')
+                # Same lookup also yields the internal id for the tal.account filter below
+                account_internal_id, acct_type = get_account_info(account)
+                if account_internal_id:
                     is_bs_account = is_balance_sheet_account(acct_type)
-                    print(f"DEBUG - Account {account} type: {acct_type}, is_bs: {is_bs_account}", file=sys.stderr)
+                    app.logger.debug("Account %s type: %s, is_bs: %s", account, acct_type, is_bs_account)
+                else:
+                    # Account number doesn't exist - nothing can post to it, skip the balance query
+                    app.logger.debug("Account %s not found - returning 0 without querying", account)
+                    return str(0.0)
             except Exception as e:
                 print(f"DEBUG - Could not determine account type for {account}: {e}", file=sys.stderr)
         
@@ -4891,27 +5635,29 @@ def get_balance():
                     
                     if len(bs_types) > 0 and len(pl_types) == 0:
                         is_bs_account = True
-                        print(f"DEBUG - Wildcard {account}: ALL matching accounts are BS ({account_types})", file=sys.stderr)
+                        app.logger.debug("Wildcard %s: ALL matching accounts are BS (%s)", account, account_types)
                     elif len(pl_types) > 0 and len(bs_types) == 0:
                         is_bs_account = False
-                        print(f"DEBUG - Wildcard {account}: ALL matching accounts are P&L ({account_types})", file=sys.stderr)
+                        app.logger.debug("Wildcard %s: ALL matching accounts are P&L (%s)", account, account_types)
                     else:
                         # Mixed types - default to P&L behavior (safer)
                         is_bs_account = False
-                        print(f"DEBUG - Wildcard {account}: MIXED account types ({account_types}) - using P&L behavior", file=sys.stderr)
+                        app.logger.debug("Wildcard %s: MIXED account types (%s) - using P&L behavior", account, account_types)
                 else:
-                    print(f"DEBUG - Wildcard {account}: Could not determine types, using P&L behavior", file=sys.stderr)
+                    app.logger.debug("Wildcard %s: Could not determine types, using P&L behavior", account)
             except Exception as e:
                 print(f"DEBUG - Wildcard {account}: Error querying types ({e}), using P&L behavior", file=sys.stderr)
         
         # For BS accounts, ignore from_period (use cumulative from inception)
         if is_bs_account and from_period and to_period:
-            print(f"DEBUG - BS account detected: using cumulative through {to_period} (ignoring from_period={from_period})", file=sys.stderr)
+            app.logger.debug("BS account detected: using cumulative through %s (ignoring from_period=%s)", to_period, from_period)
             from_period = ''  # Clear from_period for cumulative calculation
         
         # Build WHERE clause
-        # Use build_account_filter to support wildcards like '4*' for all revenue accounts
-        account_filter = build_account_filter([account])
+        # Exact accounts filter on tal.account (internal id) so NetSuite can probe the
+        # TransactionAccountingLine account index before joining; wildcards like '4*'
+        # still go through build_account_filter on a.acctnumber
+        account_filter = f"tal.account = {account_internal_id}" if account_internal_id else build_account_filter([account])
         where_clauses = [
             "t.posting = 'T'",
             "tal.posting = 'T'",
@@ -4927,22 +5673,22 @@ def get_balance():
             
             # OPTIMIZATION: For root consolidated subsidiary, skip the filter entirely
             # (includes all subs anyway - avoids expensive TransactionLine join for BS queries)
-            print(f"DEBUG - subsidiary={subsidiary}, default_subsidiary_id={default_subsidiary_id}, wants_consolidated={wants_consolidated}", file=sys.stderr)
+            app.logger.debug("subsidiary=%s, default_subsidiary_id=%s, wants_consolidated=%s", subsidiary, default_subsidiary_id, wants_consolidated)
             is_root_consolidated = (subsidiary == str(default_subsidiary_id)) and use_hierarchy
-            print(f"DEBUG - is_root_consolidated={is_root_consolidated}", file=sys.stderr)
+            app.logger.debug("is_root_consolidated=%s", is_root_consolidated)
             
             if is_root_consolidated:
-                print(f"DEBUG - Root consolidated subsidiary (ID={subsidiary}) - skipping filter (includes all subs)", file=sys.stderr)
+                app.logger.debug("Root consolidated subsidiary (ID=%s) - skipping filter (includes all subs)", subsidiary)
                 # Don't add filter, don't need TransactionLine join
             elif use_hierarchy:
                 hierarchy_subs = get_subsidiaries_in_hierarchy(subsidiary)
                 sub_filter = ', '.join(hierarchy_subs)
                 where_clauses.append(f"tl.subsidiary IN ({sub_filter})")
-                print(f"DEBUG - Consolidated subsidiary filter: {len(hierarchy_subs)} subsidiaries in hierarchy")
+                app.logger.debug("Consolidated subsidiary filter: %s subsidiaries in hierarchy", len(hierarchy_subs))
                 needs_line_join_for_subsidiary = True
             else:
                 where_clauses.append(f"tl.subsidiary = {subsidiary}")
-                print(f"DEBUG - Single subsidiary filter: {subsidiary}")
+                app.logger.debug("Single subsidiary filter: %s", subsidiary)
                 needs_line_join_for_subsidiary = True
         
         # Handle period filters - support both period IDs and names
@@ -4954,6 +5700,7 @@ def get_balance():
             else:
                 # Convert period names to DATE ranges
                 # Period IDs don't work because they include quarterly/fiscal periods
+                get_period_dates_bulk([from_period, to_period])  # at most one round-trip for both ends
                 from_start, from_end, _ = get_period_dates_from_name(from_period)
                 to_start, to_end, _ = get_period_dates_from_name(to_period)
                 if from_start and to_end:
@@ -4980,7 +5727,7 @@ def get_balance():
                     # Convert MM/DD/YYYY to YYYY-MM-DD for TO_DATE function
                     try:
                         from datetime import datetime
-                        end_date_obj = datetime.strptime(to_end, '%m/%d/%Y')
+                        end_date_obj = parse_ns_date(to_end)
                         end_date_str = end_date_obj.strftime('%Y-%m-%d')
                     except:
                         end_date_str = to_end
@@ -5004,8 +5751,8 @@ def get_balance():
         # Build SuiteQL query - use CASE for correct balance by account type
         # Only join AccountingPeriod if we're using period names
         # Note: Department filtering requires TransactionLine join for journal entries
-        print(f"DEBUG - WHERE clause: {where_clause}", file=sys.stderr)
-        print(f"DEBUG - Department param: {department}", file=sys.stderr)
+        app.logger.debug("WHERE clause: %s", where_clause)
+        app.logger.debug("Department param: %s", department)
         
         # Determine target subsidiary for consolidation
         # Must use valid subsidiary ID (not NULL) for BUILTIN.CONSOLIDATE
@@ -5017,172 +5764,44 @@ def get_balance():
         use_hierarchy = wants_consolidated
         
         # Sign multiplier: flip Income/OthIncome from credits (negative) to positive display
-        sign_sql = f"* CASE WHEN a.accttype IN ({INCOME_TYPES_SQL}) THEN -1 ELSE 1 END"
+        # An exact account has one known type, so the sign is a constant decided here;
+        # only wildcards (mixed types) need the per-row CASE
+        if account_internal_id:
+            sign_sql = "* -1" if AccountType.is_income(acct_type) else ""
+        else:
+            sign_sql = f"* CASE WHEN a.accttype IN ({INCOME_TYPES_SQL}) THEN -1 ELSE 1 END"
         
         # Check if this is a cumulative BS query (no from_period, only to_period with t.trandate)
         is_cumulative_bs = is_bs_account and not from_period and to_period and not to_period.isdigit()
         
-        # Always use BUILTIN.CONSOLIDATE - works for both OneWorld and non-OneWorld
+        # Assemble the joins once: TransactionLine only for line-level filters, Account only
+        # for wildcards, and AccountingPeriod only when filtering by period names
+        # (cumulative BS uses t.trandate)
+        joins = ["JOIN Transaction t ON t.id = tal.transaction"]
+        if needs_line_join:
+            joins.append(_TL_JOIN_SQL)
+        if not account_internal_id:
+            # Account is only needed to match wildcard acctnumbers and their per-row sign CASE
+            joins.append("JOIN Account a ON a.id = tal.account")
         if is_cumulative_bs:
             # OPTIMIZED BS QUERY: No AccountingPeriod join needed - use t.trandate directly
-            print(f"DEBUG - Using optimized cumulative BS query (no AP join)", file=sys.stderr)
-            if needs_line_join:
-                query = f"""
-                    SELECT SUM(x.cons_amt) AS balance
-                    FROM (
-                        SELECT
-                                    TO_NUMBER(
-                                        BUILTIN.CONSOLIDATE(
-                                            tal.amount,
-                                            'LEDGER',
-                                            'DEFAULT',
-                                            'DEFAULT',
-                                            {target_sub},
-                                            t.postingperiod,
-                                            'DEFAULT'
-                                        )
-                                    )
-                            {sign_sql}
- AS cons_amt
-                        FROM TransactionAccountingLine tal
-                            JOIN Transaction t ON t.id = tal.transaction
-                            JOIN TransactionLine tl ON t.id = tl.transaction AND tal.transactionline = tl.id
-                            JOIN Account a ON a.id = tal.account
-                        WHERE {where_clause}
-                    ) x
-                """
-            else:
-                query = f"""
-                    SELECT SUM(x.cons_amt) AS balance
-                    FROM (
-                        SELECT
-                                    TO_NUMBER(
-                                        BUILTIN.CONSOLIDATE(
-                                            tal.amount,
-                                            'LEDGER',
-                                            'DEFAULT',
-                                            'DEFAULT',
-                                            {target_sub},
-                                            t.postingperiod,
-                                            'DEFAULT'
-                                        )
-                                    )
-                            {sign_sql}
- AS cons_amt
-                        FROM TransactionAccountingLine tal
-                            JOIN Transaction t ON t.id = tal.transaction
-                            JOIN Account a ON a.id = tal.account
-                        WHERE {where_clause}
-                    ) x
-                """
+            app.logger.debug("Using optimized cumulative BS query (no AP join)")
         elif (from_period and not from_period.isdigit()) or (to_period and not to_period.isdigit()):
-            if needs_line_join:
-                query = f"""
-                    SELECT SUM(x.cons_amt) AS balance
-                    FROM (
-                        SELECT
-                                    TO_NUMBER(
-                                        BUILTIN.CONSOLIDATE(
-                                            tal.amount,
-                                            'LEDGER',
-                                            'DEFAULT',
-                                            'DEFAULT',
-                                            {target_sub},
-                                            t.postingperiod,
-                                            'DEFAULT'
-                                        )
-                                    )
-                            {sign_sql}
- AS cons_amt
-                        FROM TransactionAccountingLine tal
-                            JOIN Transaction t ON t.id = tal.transaction
-                            JOIN TransactionLine tl ON t.id = tl.transaction AND tal.transactionline = tl.id
-                            JOIN Account a ON a.id = tal.account
-                            JOIN AccountingPeriod ap ON ap.id = t.postingperiod
-                        WHERE {where_clause}
-                    ) x
-                """
-            else:
-                query = f"""
-                    SELECT SUM(x.cons_amt) AS balance
-                    FROM (
-                        SELECT
-                                    TO_NUMBER(
-                                        BUILTIN.CONSOLIDATE(
-                                            tal.amount,
-                                            'LEDGER',
-                                            'DEFAULT',
-                                            'DEFAULT',
-                                            {target_sub},
-                                            t.postingperiod,
-                                            'DEFAULT'
-                                        )
-                                    )
-                            {sign_sql}
- AS cons_amt
-                        FROM TransactionAccountingLine tal
-                            JOIN Transaction t ON t.id = tal.transaction
-                            JOIN Account a ON a.id = tal.account
-                            JOIN AccountingPeriod ap ON ap.id = t.postingperiod
-                        WHERE {where_clause}
-                    ) x
-                """
-        else:
-            if needs_line_join:
-                query = f"""
-                    SELECT SUM(x.cons_amt) AS balance
-                    FROM (
-                        SELECT
-                                    TO_NUMBER(
-                                        BUILTIN.CONSOLIDATE(
-                                            tal.amount,
-                                            'LEDGER',
-                                            'DEFAULT',
-                                            'DEFAULT',
-                                            {target_sub},
-                                            t.postingperiod,
-                                            'DEFAULT'
-                                        )
-                                    )
-                            {sign_sql}
- AS cons_amt
-                        FROM TransactionAccountingLine tal
-                            JOIN Transaction t ON t.id = tal.transaction
-                            JOIN TransactionLine tl ON t.id = tl.transaction AND tal.transactionline = tl.id
-                            JOIN Account a ON a.id = tal.account
-                        WHERE {where_clause}
-                    ) x
-                """
-            else:
-                query = f"""
-                    SELECT SUM(x.cons_amt) AS balance
-                    FROM (
-                        SELECT
-                                    TO_NUMBER(
-                                        BUILTIN.CONSOLIDATE(
-                                            tal.amount,
-                                            'LEDGER',
-                                            'DEFAULT',
-                                            'DEFAULT',
-                                            {target_sub},
-                                            t.postingperiod,
-                                            'DEFAULT'
-                                        )
-                                    )
-                            {sign_sql}
- AS cons_amt
-                        FROM TransactionAccountingLine tal
-                            JOIN Transaction t ON t.id = tal.transaction
-                            JOIN Account a ON a.id = tal.account
-                        WHERE {where_clause}
-                    ) x
-                """
+            joins.append("JOIN AccountingPeriod ap ON ap.id = t.postingperiod")
+        
+        query_params = {
+            'amount_calc': build_consolidate_amount(target_sub, 't.postingperiod'),
+            'sign_sql': sign_sql,
+            'joins': "\n                            ".join(joins),
+            'where_clause': where_clause
+        }
+        query = _BALANCE_QUERY_TEMPLATE.format(**query_params)
         
-        print(f"DEBUG - Full query:\n{query}", file=sys.stderr)
+        app.logger.debug("Full query:\n%s", query)
         
         # Use longer timeout for cumulative BS queries (they scan all historical data)
         query_timeout = 90 if is_cumulative_bs else 30
-        print(f"DEBUG - Query timeout: {query_timeout}s (is_cumulative_bs={is_cumulative_bs})", file=sys.stderr)
+        app.logger.debug("Query timeout: %ss (is_cumulative_bs=%s)", query_timeout, is_cumulative_bs)
         
         result = query_netsuite(query, timeout=query_timeout)
         
@@ -5205,129 +5824,12 @@ def get_balance():
         include_breakdown = request.args.get('include_breakdown', 'false').lower() == 'true'
         
         if '*' in account and include_breakdown:
-            print(f"DEBUG - Wildcard with breakdown requested: {account}", file=sys.stderr)
-            
-            # Query individual account balances
-            # Modify query to GROUP BY account number
-            breakdown_sign_sql = f"* CASE WHEN a.accttype IN ({INCOME_TYPES_SQL}) THEN -1 ELSE 1 END"
+            app.logger.debug("Wildcard with breakdown requested: %s", account)
             
-            if is_cumulative_bs:
-                if needs_line_join:
-                    breakdown_query = f"""
-                        SELECT a.acctnumber, SUM(x.cons_amt) AS balance
-                        FROM (
-                            SELECT
-                                tal.account,
-                                TO_NUMBER(
-                                    BUILTIN.CONSOLIDATE(
-                                        tal.amount,
-                                        'LEDGER',
-                                        'DEFAULT',
-                                        'DEFAULT',
-                                        {target_sub},
-                                        t.postingperiod,
-                                        'DEFAULT'
-                                    )
-                                )
-                                {breakdown_sign_sql}
-                                AS cons_amt
-                            FROM TransactionAccountingLine tal
-                                JOIN Transaction t ON t.id = tal.transaction
-                                JOIN TransactionLine tl ON t.id = tl.transaction AND tal.transactionline = tl.id
-                                JOIN Account a ON a.id = tal.account
-                            WHERE {where_clause}
-                        ) x
-                        JOIN Account a ON a.id = x.account
-                        GROUP BY a.acctnumber
-                    """
-                else:
-                    breakdown_query = f"""
-                        SELECT a.acctnumber, SUM(x.cons_amt) AS balance
-                        FROM (
-                            SELECT
-                                tal.account,
-                                TO_NUMBER(
-                                    BUILTIN.CONSOLIDATE(
-                                        tal.amount,
-                                        'LEDGER',
-                                        'DEFAULT',
-                                        'DEFAULT',
-                                        {target_sub},
-                                        t.postingperiod,
-                                        'DEFAULT'
-                                    )
-                                )
-                                {breakdown_sign_sql}
-                                AS cons_amt
-                            FROM TransactionAccountingLine tal
-                                JOIN Transaction t ON t.id = tal.transaction
-                                JOIN Account a ON a.id = tal.account
-                            WHERE {where_clause}
-                        ) x
-                        JOIN Account a ON a.id = x.account
-                        GROUP BY a.acctnumber
-                    """
-            else:
-                # Non-cumulative (P&L) query with breakdown
-                if needs_line_join:
-                    breakdown_query = f"""
-                        SELECT a.acctnumber, SUM(x.cons_amt) AS balance
-                        FROM (
-                            SELECT
-                                tal.account,
-                                TO_NUMBER(
-                                    BUILTIN.CONSOLIDATE(
-                                        tal.amount,
-                                        'LEDGER',
-                                        'DEFAULT',
-                                        'DEFAULT',
-                                        {target_sub},
-                                        t.postingperiod,
-                                        'DEFAULT'
-                                    )
-                                )
-                                {breakdown_sign_sql}
-                                AS cons_amt
-                            FROM TransactionAccountingLine tal
-                                JOIN Transaction t ON t.id = tal.transaction
-                                JOIN TransactionLine tl ON t.id = tl.transaction AND tal.transactionline = tl.id
-                                JOIN Account a ON a.id = tal.account
-                                JOIN AccountingPeriod ap ON ap.id = t.postingperiod
-                            WHERE {where_clause}
-                        ) x
-                        JOIN Account a ON a.id = x.account
-                        GROUP BY a.acctnumber
-                    """
-                else:
-                    breakdown_query = f"""
-                        SELECT a.acctnumber, SUM(x.cons_amt) AS balance
-                        FROM (
-                            SELECT
-                                tal.account,
-                                TO_NUMBER(
-                                    BUILTIN.CONSOLIDATE(
-                                        tal.amount,
-                                        'LEDGER',
-                                        'DEFAULT',
-                                        'DEFAULT',
-                                        {target_sub},
-                                        t.postingperiod,
-                                        'DEFAULT'
-                                    )
-                                )
-                                {breakdown_sign_sql}
-                                AS cons_amt
-                            FROM TransactionAccountingLine tal
-                                JOIN Transaction t ON t.id = tal.transaction
-                                JOIN Account a ON a.id = tal.account
-                                JOIN AccountingPeriod ap ON ap.id = t.postingperiod
-                            WHERE {where_clause}
-                        ) x
-                        JOIN Account a ON a.id = x.account
-                        GROUP BY a.acctnumber
-                    """
+            # Same joins and filters as the total, grouped by account number
+            breakdown_query = _BALANCE_BREAKDOWN_QUERY_TEMPLATE.format(**query_params)
             
-            print(f"DEBUG - Breakdown query:\n{breakdown_query}", file=sys.stderr)
+            app.logger.debug("Breakdown query:\n%s", breakdown_query)
             
             try:
                 breakdown_result = query_netsuite(breakdown_query, timeout=query_timeout)
@@ -5340,7 +5842,7 @@ def get_balance():
                         if acct_num:
                             accounts[acct_num] = float(acct_bal) if acct_bal else 0.0
                     
-                    print(f"DEBUG - Breakdown: {len(accounts)} individual accounts", file=sys.stderr)
+                    app.logger.debug("Breakdown: %s individual accounts", len(accounts))
                     
                     return jsonify({
                         'total': total_balance,
@@ -5360,6 +5862,19 @@ def get_balance():
         return jsonify({'error': str(e)}), 500
 
 
+# Budgets can be unavailable for the whole account (feature off / role lacks permission).
+# Remember that for a while so a sheet of budget cells doesn't pay one failing
+# round-trip per cell; short TTL in case it was a transient permissions hiccup.
+BUDGET_UNAVAILABLE_TTL = 15 * 60  # 15 minutes in seconds
+budget_unavailable_until = 0.0
+
+
+def is_budget_unavailable_error(result):
+    """True if a query_netsuite error dict says the budget records are missing / not permitted"""
+    message = f"{result.get('error', '')} {result.get('details', '')}".lower()
+    return 'budget' in message and ('was not found' in message or 'permission' in message)
+
+
 @app.route('/budget')
 def get_budget():
     """
@@ -5381,16 +5896,18 @@ def get_budget():
     
     Returns: Budget amount for the specified period(s)
     """
+    global budget_unavailable_until
+    
+    # Budgets known to be unavailable for this account - nothing to query
+    if time.time() < budget_unavailable_until:
+        return '0'
+    
     try:
         # Get parameters (accept both 'from'/'to' and 'from_period'/'to_period')
         account = request.args.get('account', '')
-        subsidiary = request.args.get('subsidiary', '')
         budget_category = request.args.get('budget_category', '')
         from_period = request.args.get('from_period', '') or request.args.get('from', '')
         to_period = request.args.get('to_period', '') or request.args.get('to', '') or from_period
-        department = request.args.get('department', '')
-        class_id = request.args.get('class', '')
-        location = request.args.get('location', '')
         
         # Handle year-only format (e.g., "2025" -> "Jan 2025" to "Dec 2025")
         if is_year_only(from_period):
@@ -5406,10 +5923,7 @@ def get_budget():
             accountingbook = DEFAULT_ACCOUNTING_BOOK
         
         # Convert names to IDs
-        subsidiary = convert_name_to_id('subsidiary', subsidiary)
-        department = convert_name_to_id('department', department)
-        class_id = convert_name_to_id('class', class_id)
-        location = convert_name_to_id('location', location)
+        _, subsidiary, class_id, department, location = resolve_dimension_filters(request.args)
         
         if not account:
             return jsonify({'error': 'Account number required'}), 400
@@ -5421,7 +5935,8 @@ def get_budget():
         
         # Period filter - use AccountingPeriod table for date range
         if from_period and to_period:
-            # Get period date ranges
+            # Get period date ranges (at most one round-trip for both ends)
+            get_period_dates_bulk([from_period, to_period])
             from_dates = get_period_dates_from_name(from_period)
             to_dates = get_period_dates_from_name(to_period)
             from_start = from_dates[0] if from_dates else None
@@ -5475,10 +5990,7 @@ def get_budget():
         query = f"""
             SELECT 
                 SUM(
-                    TO_NUMBER(BUILTIN.CONSOLIDATE(
-                        bm.amount, 'LEDGER', 'DEFAULT', 'DEFAULT',
-                        {target_sub}, bm.period, 'DEFAULT'
-                    ))
+                    {build_consolidate_amount(target_sub, 'bm.period', 'bm.amount')}
                 ) AS budget_amount
             FROM BudgetsMachine bm
             INNER JOIN Budgets b ON bm.budget = b.id
@@ -5487,12 +5999,15 @@ def get_budget():
             WHERE {where_clause}
         """
         
-        print(f"Budget query (BudgetsMachine): {query[:500]}...", file=sys.stderr)
+        app.logger.debug("Budget query (BudgetsMachine): %s...", query[:500])
         result = query_netsuite(query)
         
         # Check for errors
         if isinstance(result, dict) and 'error' in result:
             print(f"Budget query failed: {result.get('error')}", file=sys.stderr)
+            if is_budget_unavailable_error(result):
+                budget_unavailable_until = time.time() + BUDGET_UNAVAILABLE_TTL
+                print(f"   Budgets unavailable - returning 0 for {BUDGET_UNAVAILABLE_TTL // 60} min without querying", file=sys.stderr)
             return '0'
         
         # Return budget amount
@@ -5651,10 +6166,7 @@ def batch_budget():
                 a.acctnumber,
                 ap.periodname,
                 SUM(
-                    TO_NUMBER(BUILTIN.CONSOLIDATE(
-                        bm.amount, 'LEDGER', 'DEFAULT', 'DEFAULT',
-                        {target_sub}, bm.period, 'DEFAULT'
-                    ))
+                    {build_consolidate_amount(target_sub, 'bm.period', 'bm.amount')}
                 ) AS budget_amount
             FROM BudgetsMachine bm
             INNER JOIN Budgets b ON bm.budget = b.id
@@ -5760,8 +6272,6 @@ def get_all_budgets():
         
         # Build period ID to month mapping
         period_map = {}  # period_id -> month name (e.g., "Jan")
-        month_names = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 
-                       'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
         for row in period_result:
             period_id = str(row.get('id'))
             # Extract month from startdate
@@ -5774,7 +6284,7 @@ def get_all_budgets():
                     else:
                         month_num = int(startdate.split('-')[1])
                     if 1 <= month_num <= 12:
-                        period_map[period_id] = month_names[month_num - 1]
+                        period_map[period_id] = _MONTH_NAMES[month_num]
                 except:
                     pass
         
@@ -5815,10 +6325,7 @@ def get_all_budgets():
                 a.accttype AS account_type,
                 bm.period AS period_id,
                 SUM(
-                    TO_NUMBER(BUILTIN.CONSOLIDATE(
-                        bm.amount, 'LEDGER', 'DEFAULT', 'DEFAULT',
-                        {target_sub}, bm.period, 'DEFAULT'
-                    ))
+                    {build_consolidate_amount(target_sub, 'bm.period', 'bm.amount')}
                 ) AS amount
             FROM BudgetsMachine bm
             INNER JOIN Budgets b ON bm.budget = b.id
@@ -5892,6 +6399,180 @@ def get_all_budgets():
         return jsonify({'error': str(e)}), 500
 
 
+# ============================================================================
+# TRANSACTION DRILL-DOWN QUERY TEMPLATES
+# Built once at import time - only the WHERE clause varies per request.
+# Keeping the query text stable also lets NetSuite re-use its parsed plan.
+# For drill-down, we show RAW transaction amounts (no consolidation)
+# NOTE: No ORDER BY here - pagination function adds it
+# {batch_key_column} is '' for single drill-downs, "N AS batch_key," for /batch/transactions
+# Debit/credit are aggregated per (transaction, account) on a narrow key first; the
+# descriptive columns (tranid, memo, entity, account name) are joined onto the grouped
+# rows - small GROUP BY state, and Entity is only probed for matching transactions.
+# Column order is relied on by /batch/transactions' ORDER BY positions.
+# ============================================================================
+_TX_QUERY_SELECT = """
+                SELECT {batch_key_column}
+                    t.id AS transaction_id,
+                    t.tranid AS transaction_number,
+                    t.trandisplayname AS transaction_type,
+                    t.recordtype AS record_type,
+                    TO_CHAR(t.trandate, 'YYYY-MM-DD') AS transaction_date,
+                    e.entityid AS entity_name,
+                    e.id AS entity_id,
+                    t.memo,
+                    x.debit AS debit,
+                    x.credit AS credit,
+                    a.acctnumber AS account_number,
+                    a.accountsearchdisplayname AS account_name
+                FROM (
+                    SELECT
+                        t.id AS transaction_key,
+                        tal.account AS account_key,
+                        SUM(COALESCE(tal.debit, 0)) AS debit,
+                        SUM(COALESCE(tal.credit, 0)) AS credit
+                    FROM 
+                        Transaction t"""
+
+_TX_QUERY_TAIL = """
+                    INNER JOIN 
+                        Account a ON tal.account = a.id
+                    INNER JOIN
+                        AccountingPeriod ap ON t.postingperiod = ap.id
+                    WHERE 
+                        {where_clause}
+                    GROUP BY
+                        t.id, tal.account
+                ) x
+                INNER JOIN
+                    Transaction t ON t.id = x.transaction_key
+                INNER JOIN
+                    Account a ON a.id = x.account_key
+                LEFT JOIN
+                    Entity e ON t.entity = e.id
+            """
+
+# With TransactionLine join (needed for tl.subsidiary / department / class / location filters)
+_TX_QUERY_LINE_JOIN_TMPL = _TX_QUERY_SELECT + """
+                    INNER JOIN 
+                        TransactionLine tl ON t.id = tl.transaction
+                    INNER JOIN 
+                        TransactionAccountingLine tal ON t.id = tal.transaction AND tl.id = tal.transactionline""" + _TX_QUERY_TAIL
+
+# Without TransactionLine join (no line-level filters)
+_TX_QUERY_NO_JOIN_TMPL = _TX_QUERY_SELECT + """
+                    INNER JOIN 
+                        TransactionAccountingLine tal ON t.id = tal.transaction""" + _TX_QUERY_TAIL
+
+# Drill-down row order for OFFSET/FETCH paging. Rows are unique per (transaction,
+# account), so t.id + a.id break ties - date/tranid alone repeat across lines and
+# record types, which would duplicate or skip rows at page boundaries
+_TX_QUERY_ORDER_BY = "t.trandate, t.tranid, t.id, a.id"
+
+# Largest /transactions page - one below SuiteQL's 1000-row response cap so the
+# extra look-ahead row that drives has_more still fits
+TRANSACTIONS_PAGE_MAX = 999
+
+# Upper bound on drill-downs combined into one /batch/transactions UNION query
+MAX_BATCH_TRANSACTION_REQUESTS = 50
+
+
+def build_transaction_where(account, period, subsidiary, wants_consolidated,
+                            class_id, department, location):
+    """
+    Build the WHERE clause for a transaction drill-down.
+
+    Filters must already be converted to IDs (see convert_name_to_id).
+
+    Returns:
+        (where_clause, needs_line_join) - needs_line_join is True when any
+        tl.* filter is present and the TransactionLine join is required
+    """
+    # Build WHERE clause with filters
+    # Use build_account_filter to support wildcards like '4*'
+    account_filter = build_account_filter([account])
+
+    where_conditions = [
+        "t.posting = 'T'",
+        "tal.posting = 'T'",
+        account_filter  # Supports wildcards like '4*' → LIKE '4%'
+    ]
+
+    # Handle period - could be year-only ("2025") or month ("Dec 2025")
+    if is_year_only(period):
+        # Year-only: get all transactions in that year
+        year = period.strip()
+        where_conditions.append(f"t.trandate >= TO_DATE('{year}-01-01', 'YYYY-MM-DD')")
+        where_conditions.append(f"t.trandate <= TO_DATE('{year}-12-31', 'YYYY-MM-DD')")
+        print(f"DEBUG - Year-only period '{period}' → full year date range", file=sys.stderr)
+    else:
+        # Specific month period
+        where_conditions.append(f"ap.periodname = '{escape_sql(period)}'")
+
+    # CRITICAL: Use tl.subsidiary for GL line-level filtering (intercompany JEs)
+    needs_line_join = False
+    if subsidiary:
+        use_hierarchy = wants_consolidated
+
+        if use_hierarchy:
+            hierarchy_subs = get_subsidiaries_in_hierarchy(subsidiary)
+            sub_filter = ', '.join(hierarchy_subs)
+            where_conditions.append(f"tl.subsidiary IN ({sub_filter})")
+        else:
+            where_conditions.append(f"tl.subsidiary = {subsidiary}")
+        needs_line_join = True
+
+    # Segment filters - any of these also needs the TransactionLine join
+    extra = [f"tl.{col} = {val}" for col, val in
+             (('class', class_id), ('department', department), ('location', location)) if val]
+    where_conditions.extend(extra)
+    needs_line_join = needs_line_join or bool(extra)
+
+    return " AND ".join(where_conditions), needs_line_join
+
+
+# Record types → NetSuite URL paths for drill-down links
+TRANSACTION_URL_PATHS = {
+    'invoice': 'custinvc',
+    'bill': 'vendorbill',
+    'journalentry': 'journal',
+    'journal': 'journal',
+    'payment': 'custpymt',
+    'vendorpayment': 'vendpymt',
+    'creditmemo': 'custcred',
+    'vendorcredit': 'vendcred',
+    'check': 'check',
+    'deposit': 'deposit',
+    'cashsale': 'cashsale',
+    'cashrefund': 'cashrfnd',
+    'expensereport': 'exprept'
+}
+
+_TRANSACTION_URL_BASE = f"https://{account_id}.app.netsuite.com/app/accounting/transactions/"
+
+# Full "...<path>.nl?id=" prefix per known record type, built once at import
+_TRANSACTION_URL_PREFIXES = {
+    record_type: f"{_TRANSACTION_URL_BASE}{path}.nl?id="
+    for record_type, path in TRANSACTION_URL_PATHS.items()
+}
+
+
+def add_transaction_links(rows):
+    """Add netsuite_url and net_amount to each drill-down row (in place)"""
+    # Local bindings - this runs once per row for drill-downs of thousands of rows
+    prefixes = _TRANSACTION_URL_PREFIXES
+    base = _TRANSACTION_URL_BASE
+    for row in rows:
+        record_type = (row.get('record_type') or '').lower()
+        prefix = prefixes.get(record_type) or f"{base}{record_type}.nl?id="
+        row['netsuite_url'] = f"{prefix}{row.get('transaction_id')}"
+
+        # Calculate net amount for this account
+        debit = row.get('debit')
+        credit = row.get('credit')
+        row['net_amount'] = (float(debit) if debit else 0) - (float(credit) if credit else 0)
+
+
 @app.route('/transactions', methods=['GET'])
 def get_transactions():
     """
@@ -5905,22 +6586,22 @@ def get_transactions():
         - class: Class ID (optional)
         - department: Department ID (optional)
         - location: Location ID (optional)
+        - limit: Max rows to return, up to TRANSACTIONS_PAGE_MAX (optional - default returns all rows)
+        - offset: Rows to skip when paging with limit (optional, default 0)
     
     Returns: JSON with transaction details including NetSuite URLs
+    (plus offset/has_more when limit is given)
     """
     try:
         account = request.args.get('account')
         period = request.args.get('period')
-        raw_subsidiary = request.args.get('subsidiary', '')
-        class_id = request.args.get('class', '')
-        department = request.args.get('department', '')
-        location = request.args.get('location', '')
+        
+        # Optional paging - without limit every matching row is returned (as before)
+        limit = max(request.args.get('limit', 0, type=int), 0)
+        offset = max(request.args.get('offset', 0, type=int), 0)
         
         # Convert names to IDs (accepts names OR IDs)
-        subsidiary = convert_name_to_id('subsidiary', raw_subsidiary)
-        class_id = convert_name_to_id('class', class_id)
-        department = convert_name_to_id('department', department)
-        location = convert_name_to_id('location', location)
+        raw_subsidiary, subsidiary, class_id, department, location = resolve_dimension_filters(request.args)
         
         # Determine consolidated status (explicit OR auto from root)
         wants_consolidated = should_use_consolidated(raw_subsidiary, subsidiary)
@@ -5929,177 +6610,54 @@ def get_transactions():
             return jsonify({'error': 'Missing required parameters: account and period'}), 400
         
         is_wildcard = '*' in str(account)
-        print(f"DEBUG - Transaction drill-down request:", file=sys.stderr)
-        print(f"  Account: {account} {'(WILDCARD)' if is_wildcard else ''}", file=sys.stderr)
-        print(f"  Period: {period}", file=sys.stderr)
-        print(f"  Subsidiary: {subsidiary}", file=sys.stderr)
-        print(f"  Department: {department}", file=sys.stderr)
-        print(f"  Class: {class_id}", file=sys.stderr)
-        print(f"  Location: {location}", file=sys.stderr)
-        
-        # Build WHERE clause with filters
-        # Use build_account_filter to support wildcards like '4*'
-        account_filter = build_account_filter([account])
-        
-        where_conditions = [
-            "t.posting = 'T'",
-            "tal.posting = 'T'",
-            account_filter  # Supports wildcards like '4*' → LIKE '4%'
-        ]
-        
-        # Handle period - could be year-only ("2025") or month ("Dec 2025")
-        if is_year_only(period):
-            # Year-only: get all transactions in that year
-            year = period.strip()
-            where_conditions.append(f"t.trandate >= TO_DATE('{year}-01-01', 'YYYY-MM-DD')")
-            where_conditions.append(f"t.trandate <= TO_DATE('{year}-12-31', 'YYYY-MM-DD')")
-            print(f"DEBUG - Year-only period '{period}' → full year date range", file=sys.stderr)
-        else:
-            # Specific month period
-            where_conditions.append(f"ap.periodname = '{escape_sql(period)}'")
-        
-        # CRITICAL: Use tl.subsidiary for GL line-level filtering (intercompany JEs)
-        needs_line_join = False
-        if subsidiary:
-            use_hierarchy = wants_consolidated
-            
-            if use_hierarchy:
-                hierarchy_subs = get_subsidiaries_in_hierarchy(subsidiary)
-                sub_filter = ', '.join(hierarchy_subs)
-                where_conditions.append(f"tl.subsidiary IN ({sub_filter})")
-            else:
-                where_conditions.append(f"tl.subsidiary = {subsidiary}")
-            needs_line_join = True
-        
-        # Also need TransactionLine join if filtering by department, class, or location
-        if (department and department != '') or (class_id and class_id != '') or (location and location != ''):
-            needs_line_join = True
-        
-        if class_id:
-            where_conditions.append(f"tl.class = {class_id}")
-        if department:
-            where_conditions.append(f"tl.department = {department}")
-        if location:
-            where_conditions.append(f"tl.location = {location}")
-        
-        where_clause = " AND ".join(where_conditions)
-        
-        # SuiteQL query for transaction details
-        # For drill-down, we show RAW transaction amounts (no consolidation)
-        # This gives users the actual transaction detail, not consolidated view
-        # NOTE: No ORDER BY here - pagination function adds it
-        if needs_line_join:
-            query = f"""
-                SELECT 
-                    t.id AS transaction_id,
-                    t.tranid AS transaction_number,
-                    t.trandisplayname AS transaction_type,
-                    t.recordtype AS record_type,
-                    TO_CHAR(t.trandate, 'YYYY-MM-DD') AS transaction_date,
-                    e.entityid AS entity_name,
-                    e.id AS entity_id,
-                    t.memo,
-                    SUM(COALESCE(tal.debit, 0)) AS debit,
-                    SUM(COALESCE(tal.credit, 0)) AS credit,
-                    a.acctnumber AS account_number,
-                    a.accountsearchdisplayname AS account_name
-                FROM 
-                    Transaction t
-                INNER JOIN 
-                    TransactionLine tl ON t.id = tl.transaction
-                INNER JOIN 
-                    TransactionAccountingLine tal ON t.id = tal.transaction AND tl.id = tal.transactionline
-                INNER JOIN 
-                    Account a ON tal.account = a.id
-                INNER JOIN
-                    AccountingPeriod ap ON t.postingperiod = ap.id
-                LEFT JOIN
-                    Entity e ON t.entity = e.id
-                WHERE 
-                    {where_clause}
-                GROUP BY
-                    t.id, t.tranid, t.trandisplayname, t.recordtype, t.trandate,
-                    e.entityid, e.id, t.memo, a.acctnumber, a.accountsearchdisplayname
-            """
+        app.logger.debug("Transaction drill-down request:")
+        app.logger.debug("  Account: %s %s", account, '(WILDCARD)' if is_wildcard else '')
+        app.logger.debug("  Period: %s", period)
+        app.logger.debug("  Subsidiary: %s", subsidiary)
+        app.logger.debug("  Department: %s", department)
+        app.logger.debug("  Class: %s", class_id)
+        app.logger.debug("  Location: %s", location)
+        
+        where_clause, needs_line_join = build_transaction_where(
+            account, period, subsidiary, wants_consolidated, class_id, department, location)
+        
+        # SuiteQL query for transaction details (templates pre-built at module load)
+        tmpl = _TX_QUERY_LINE_JOIN_TMPL if needs_line_join else _TX_QUERY_NO_JOIN_TMPL
+        query = tmpl.format(batch_key_column='', where_clause=where_clause)
+        
+        # Only dump the SQL in debug mode - formatting/writing it on every call is hot-path overhead
+        app.logger.debug("Transaction drill-down query (paginated):\n%s", query)
+        
+        if limit:
+            # One page only (limit/offset from the caller) - bounded memory and first-byte latency.
+            # One extra row is fetched to tell whether another page exists.
+            page_size = min(limit, TRANSACTIONS_PAGE_MAX)
+            result = query_netsuite(
+                f"{query} ORDER BY {_TX_QUERY_ORDER_BY} OFFSET {offset} ROWS FETCH NEXT {page_size + 1} ROWS ONLY",
+                timeout=60
+            )
+            has_more = isinstance(result, list) and len(result) > page_size
+            if has_more:
+                result = result[:page_size]
         else:
-            query = f"""
-                SELECT 
-                    t.id AS transaction_id,
-                    t.tranid AS transaction_number,
-                    t.trandisplayname AS transaction_type,
-                    t.recordtype AS record_type,
-                    TO_CHAR(t.trandate, 'YYYY-MM-DD') AS transaction_date,
-                    e.entityid AS entity_name,
-                    e.id AS entity_id,
-                    t.memo,
-                    SUM(COALESCE(tal.debit, 0)) AS debit,
-                    SUM(COALESCE(tal.credit, 0)) AS credit,
-                    a.acctnumber AS account_number,
-                    a.accountsearchdisplayname AS account_name
-                FROM 
-                    Transaction t
-                INNER JOIN 
-                    TransactionAccountingLine tal ON t.id = tal.transaction
-                INNER JOIN 
-                    Account a ON tal.account = a.id
-                INNER JOIN
-                    AccountingPeriod ap ON t.postingperiod = ap.id
-                LEFT JOIN
-                    Entity e ON t.entity = e.id
-                WHERE 
-                    {where_clause}
-                GROUP BY
-                    t.id, t.tranid, t.trandisplayname, t.recordtype, t.trandate,
-                    e.entityid, e.id, t.memo, a.acctnumber, a.accountsearchdisplayname
-            """
+            # Use paginated query to handle > 1000 transactions
+            result = query_netsuite_paginated(query, timeout=60, order_by=_TX_QUERY_ORDER_BY)
         
-        print(f"DEBUG - Transaction drill-down query (paginated):\n{query[:500]}...", file=sys.stderr)
-        # Use paginated query to handle > 1000 transactions
-        result = query_netsuite_paginated(query, timeout=60, order_by="t.trandate, t.tranid")
-        
-        print(f"DEBUG - Query result type: {type(result)}", file=sys.stderr)
         if isinstance(result, list):
-            print(f"DEBUG - Found {len(result)} transactions", file=sys.stderr)
+            app.logger.debug("Found %s transactions", len(result))
             if len(result) > 0:
                 # Log first transaction to see column names and values
-                print(f"DEBUG - First transaction raw data: {result[0]}", file=sys.stderr)
-                print(f"DEBUG - Column names: {list(result[0].keys())}", file=sys.stderr)
+                app.logger.debug("First transaction raw data: %s", result[0])
+                app.logger.debug("Column names: %s", list(result[0].keys()))
         
         if isinstance(result, dict) and 'error' in result:
             print(f"DEBUG - Query error: {result}", file=sys.stderr)
             return jsonify(result), 500
         
         # Add NetSuite URL to each transaction
-        for row in result:
-            transaction_id = row.get('transaction_id')
-            record_type = row.get('record_type', '').lower()
-            
-            # Map record types to NetSuite URL paths
-            type_map = {
-                'invoice': 'custinvc',
-                'bill': 'vendorbill',
-                'journalentry': 'journal',
-                'journal': 'journal',
-                'payment': 'custpymt',
-                'vendorpayment': 'vendpymt',
-                'creditmemo': 'custcred',
-                'vendorcredit': 'vendcred',
-                'check': 'check',
-                'deposit': 'deposit',
-                'cashsale': 'cashsale',
-                'cashrefund': 'cashrfnd',
-                'expensereport': 'exprept'
-            }
-            
-            url_type = type_map.get(record_type, record_type)
-            row['netsuite_url'] = f"https://{account_id}.app.netsuite.com/app/accounting/transactions/{url_type}.nl?id={transaction_id}"
-            
-            # Calculate net amount for this account
-            debit = float(row.get('debit', 0)) if row.get('debit') else 0
-            credit = float(row.get('credit', 0)) if row.get('credit') else 0
-            row['net_amount'] = debit - credit
+        add_transaction_links(result)
         
-        return jsonify({
+        response = {
             'transactions': result,
             'count': len(result),
             'filters': {
@@ -6110,10 +6668,111 @@ def get_transactions():
                 'department': department,
                 'location': location
             }
-        })
+        }
+        if limit:
+            # Caller re-requests with offset += count while has_more
+            response['offset'] = offset
+            response['has_more'] = has_more
+        return jsonify(response)
         
     except Exception as e:
-        print(f"Error in get_transactions: {str(e)}", file=sys.stderr)
+        app.logger.exception("Error in get_transactions")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/batch/transactions', methods=['POST'])
+def batch_transactions():
+    """
+    BATCH DRILL-DOWN - Get transactions for several (account, period, filters) requests at once
+
+    Excel users often drill into neighbouring cells in sequence. Instead of one
+    NetSuite round-trip per cell, all requests go out as ONE SuiteQL UNION ALL query
+    with a batch_key column that routes rows back to the request they belong to.
+
+    POST JSON:
+    {
+        "requests": [
+            {"account": "4000", "period": "Jan 2025", "subsidiary": "", "class": "",
+             "department": "", "location": ""},
+            ...
+        ]
+    }
+
+    Returns:
+    {
+        "results": [ {transactions, count, filters}, ... ]   # same order as requests
+    }
+    """
+    try:
+        data = request.get_json() or {}
+        batch_requests = data.get('requests', [])
+
+        if not batch_requests:
+            return jsonify({'error': 'requests array is required'}), 400
+        if len(batch_requests) > MAX_BATCH_TRANSACTION_REQUESTS:
+            return jsonify({'error': f'Too many requests (max {MAX_BATCH_TRANSACTION_REQUESTS})'}), 400
+
+        print(f"📊 Batch drill-down: {len(batch_requests)} requests", file=sys.stderr)
+
+        sub_queries = []
+        filters_list = []
+        for idx, req in enumerate(batch_requests):
+            if not isinstance(req, dict):
+                return jsonify({'error': f'Request {idx}: must be an object'}), 400
+            # JSON may carry numbers (e.g. "period": 2025) - normalise to the strings
+            # the query-string endpoint would have received
+            account = str(req.get('account') or '').strip()
+            period = str(req.get('period') or '').strip()
+            if not account or not period:
+                return jsonify({'error': f'Request {idx}: missing account or period'}), 400
+
+            raw_subsidiary, subsidiary, class_id, department, location = resolve_dimension_filters(req)
+            wants_consolidated = should_use_consolidated(raw_subsidiary, subsidiary)
+
+            where_clause, needs_line_join = build_transaction_where(
+                account, period, subsidiary, wants_consolidated, class_id, department, location)
+            tmpl = _TX_QUERY_LINE_JOIN_TMPL if needs_line_join else _TX_QUERY_NO_JOIN_TMPL
+            sub_queries.append(tmpl.format(batch_key_column=f"{idx} AS batch_key,", where_clause=where_clause))
+
+            filters_list.append({
+                'account': account,
+                'period': period,
+                'subsidiary': subsidiary,
+                'class': class_id,
+                'department': department,
+                'location': location
+            })
+
+        query = "\nUNION ALL\n".join(sub_queries)
+
+        # ORDER BY positions: 1 = batch_key, 6 = transaction_date, 3 = transaction_number,
+        # then 2 = transaction_id, 12 = account_number as a unique tiebreaker across pages
+        result = query_netsuite_paginated(query, timeout=90, order_by="1, 6, 3, 2, 12")
+
+        if isinstance(result, dict) and 'error' in result:
+            print(f"❌ Batch drill-down query error: {result}", file=sys.stderr)
+            return jsonify(result), 500
+
+        add_transaction_links(result)
+
+        # Route rows back to their originating request
+        grouped = [[] for _ in batch_requests]
+        for row in result:
+            key = int(row.pop('batch_key', 0) or 0)
+            if 0 <= key < len(grouped):
+                grouped[key].append(row)
+
+        print(f"✅ Batch drill-down: {len(result)} rows across {len(batch_requests)} requests", file=sys.stderr)
+
+        return jsonify({
+            'results': [
+                {'transactions': rows, 'count': len(rows), 'filters': filters}
+                for rows, filters in zip(grouped, filters_list)
+            ]
+        })
+
+    except Exception as e:
+        app.logger.exception("Error in batch_transactions")
         return jsonify({'error': str(e)}), 500
 
 
@@ -6121,6 +6780,11 @@ def get_transactions():
 def test_connection():
     """Test NetSuite connection"""
     try:
+        # Serve recent successful result without another COUNT round-trip
+        cached = get_cached_response('test')
+        if cached is not None:
+            return cached
+        
         # Simple query to test connection
         query = "SELECT COUNT(*) as count FROM Account WHERE isinactive = 'F'"
         result = query_netsuite(query)
@@ -6132,7 +6796,7 @@ def test_connection():
                 'details': result.get('details', '')
             }), 500
         
-        return jsonify({
+        return cache_response('test', {
             'status': 'success',
             'message': 'NetSuite connection successful',
             'account': account_id,
@@ -6240,216 +6904,203 @@ def get_accounting_books():
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/lookups/all')
-def get_all_lookups():
+def build_lookups_payload():
     """
-    Get all lookups at once - Subsidiary, Department, Location, Class, Accounting Books
-    Returns data from the in-memory cache (already loaded at startup)
+    Build the /lookups/all payload - Subsidiary, Department, Location, Class, Accounting Books
     
     For subsidiaries that are parents (have children), we also add a "(Consolidated)" option
     which uses BUILTIN.CONSOLIDATE to include parent + all children transactions
+    
+    Returns:
+        (dict of lookup lists keyed by type, complete) - complete is False when any
+        sub-query failed and a list fell back to the name cache or stayed empty
     """
-    try:
-        # Load cache if not already loaded
-        if not cache_loaded:
-            load_lookup_cache()
-        
-        # Convert cache format (name→id) to list format (id, name) for frontend
-        lookups = {
-            'subsidiaries': [],
-            'departments': [],
-            'classes': [],
-            'locations': [],
-            'accountingBooks': []
-        }
-        
-        # Get subsidiary hierarchy to identify parents
-        try:
-            hierarchy_query = """
-                SELECT id, name, parent
-                FROM Subsidiary
-                WHERE isinactive = 'F'
-                ORDER BY name
-            """
-            hierarchy_result = query_netsuite(hierarchy_query)
-            
-            # Identify parent subsidiaries (those with children)
-            parent_ids = set()
-            all_subs = {}
-            
-            if isinstance(hierarchy_result, list):
-                # First pass: collect all subsidiaries and their parents
-                for row in hierarchy_result:
-                    sub_id = str(row['id'])
-                    parent_id = str(row['parent']) if row.get('parent') else None
-                    all_subs[sub_id] = {
-                        'name': row['name'],
-                        'parent': parent_id
-                    }
-                    if parent_id:
-                        parent_ids.add(parent_id)
-                
-                # Second pass: calculate depth for each subsidiary
-                def get_depth(sub_id):
-                    depth = 0
-                    current = sub_id
-                    while current and current in all_subs and all_subs[current]['parent']:
-                        depth += 1
-                        current = all_subs[current]['parent']
-                    return depth
-                
-                # Add all subsidiaries with hierarchy info
-                for sub_id, sub_info in all_subs.items():
-                    depth = get_depth(sub_id)
-                    lookups['subsidiaries'].append({
-                        'id': sub_id,
-                        'name': sub_info['name'],
-                        'parent': sub_info['parent'],
-                        'depth': depth
-                    })
-                    
-                    # If this is a parent, also add "(Consolidated)" version
-                    if sub_id in parent_ids:
-                        lookups['subsidiaries'].append({
-                            'id': sub_id,  # Same ID, BUILTIN.CONSOLIDATE handles consolidation
-                            'name': f"{sub_info['name']} (Consolidated)",
-                            'parent': sub_info['parent'],
-                            'depth': depth,
-                            'isConsolidated': True
-                        })
-        except Exception as e:
-            print(f"Error loading subsidiary hierarchy: {e}", file=sys.stderr)
-            # Fallback to cache
-            for name, id_val in lookup_cache['subsidiaries'].items():
-                lookups['subsidiaries'].append({
-                    'id': id_val,
-                    'name': name.title()
-                })
-        
-        # Load Departments directly from table for proper display names
-        try:
-            dept_query = """
-                SELECT id, name, fullName, isinactive 
-                FROM Department 
-                WHERE isinactive = 'F'
-                ORDER BY fullName
-            """
-            dept_result = query_netsuite(dept_query)
-            if isinstance(dept_result, list):
-                for row in dept_result:
-                    lookups['departments'].append({
-                        'id': str(row['id']),
-                        'name': row.get('fullname') or row['name']  # Use fullName for hierarchy display
-                    })
-        except Exception as e:
-            print(f"Error loading departments for lookup: {e}", file=sys.stderr)
-            # Fallback to cache
-            for name, id_val in lookup_cache['departments'].items():
-                lookups['departments'].append({'id': id_val, 'name': name.title()})
-        
-        # Load Classes directly from table for proper display names
-        try:
-            class_query = """
-                SELECT id, name, fullName, isinactive 
-                FROM Classification 
-                WHERE isinactive = 'F'
-                ORDER BY fullName
-            """
-            class_result = query_netsuite(class_query)
-            if isinstance(class_result, list):
-                for row in class_result:
-                    lookups['classes'].append({
-                        'id': str(row['id']),
-                        'name': row.get('fullname') or row['name']  # Use fullName for hierarchy display
-                    })
-        except Exception as e:
-            print(f"Error loading classes for lookup: {e}", file=sys.stderr)
-            # Fallback to cache
-            for name, id_val in lookup_cache['classes'].items():
-                lookups['classes'].append({'id': id_val, 'name': name.title()})
-        
-        # Load Locations directly from table for proper display names
+    # Load cache if not already loaded
+    if not cache_loaded:
+        load_lookup_cache()
+    
+    complete = True
+    
+    # Convert cache format (name→id) to list format (id, name) for frontend
+    lookups = {
+        'subsidiaries': [],
+        'departments': [],
+        'classes': [],
+        'locations': [],
+        'accountingBooks': []
+    }
+    
+    # Subsidiary hierarchy (with "(Consolidated)" entries) is pre-built by load_lookup_cache
+    if lookup_cache['subsidiaries_enriched']:
+        lookups['subsidiaries'] = lookup_cache['subsidiaries_enriched']
+    else:
+        # Fallback to name cache
+        complete = False
+        lookups['subsidiaries'] = [{'id': id_val, 'name': name.title()}
+                                   for name, id_val in lookup_cache['subsidiaries'].items()]
+    
+    # Load Departments, Classes and Locations directly from their tables for proper
+    # display names (fullName shows the hierarchy); fall back to the name cache on error
+    for key, table, title_case in (('departments', 'Department', True),
+                                   ('classes', 'Classification', True),
+                                   ('locations', 'Location', False)):
         try:
-            loc_query = """
+            result = query_netsuite(f"""
                 SELECT id, name, fullName, isinactive 
-                FROM Location 
+                FROM {table} 
                 WHERE isinactive = 'F'
                 ORDER BY fullName
-            """
-            loc_result = query_netsuite(loc_query)
-            if isinstance(loc_result, list):
-                for row in loc_result:
-                    lookups['locations'].append({
-                        'id': str(row['id']),
-                        'name': row.get('fullname') or row['name']  # Use fullName for hierarchy display
-                    })
-        except Exception as e:
-            print(f"Error loading locations for lookup: {e}", file=sys.stderr)
-            # Fallback to cache
-            for name, id_val in lookup_cache['locations'].items():
-                lookups['locations'].append({'id': id_val, 'name': name})
-        
-        # Fetch accounting books (Multi-Book Accounting)
-        # Try multiple approaches since different NetSuite versions/permissions may vary
-        books_loaded = False
-        try:
-            # Approach 1: Try to get distinct accounting books from transactions
-            # This works even without direct AccountingBook table access
-            books_query = """
-                SELECT DISTINCT tal.accountingbook AS id
-                FROM TransactionAccountingLine tal
-                WHERE tal.accountingbook IS NOT NULL
-            """
-            books_result = query_netsuite(books_query, timeout=15)
-            
-            if isinstance(books_result, list) and len(books_result) > 0:
-                print(f"✓ Found {len(books_result)} accounting books from transactions", file=sys.stderr)
-                for row in books_result:
-                    book_id = str(row.get('id', ''))
-                    # ID 1 is always Primary Book in NetSuite
-                    is_primary = book_id == '1'
-                    book_name = f"Book {book_id}" if book_id != '1' else "Primary Book"
-                    lookups['accountingBooks'].append({
-                        'id': book_id,
-                        'name': book_name,
-                        'isPrimary': is_primary
-                    })
-                books_loaded = True
+            """)
+            if isinstance(result, list):
+                lookups[key] = [
+                    {'id': str(row['id']), 'name': row.get('fullname') or row['name']}
+                    for row in result
+                ]
+                continue
+            print(f"Error loading {key} for lookup: {result.get('error')}", file=sys.stderr)
         except Exception as e:
-            print(f"Approach 1 (distinct from TAL) failed: {e}", file=sys.stderr)
-        
-        if not books_loaded:
-            # Approach 2: Default to Primary Book (always exists)
-            print(f"Using default Primary Book (ID 1)", file=sys.stderr)
-            lookups['accountingBooks'].append({
-                'id': '1',
-                'name': 'Primary Book',
-                'isPrimary': True
-            })
+            print(f"Error loading {key} for lookup: {e}", file=sys.stderr)
+        complete = False
+        lookups[key] = [{'id': id_val, 'name': name.title() if title_case else name}
+                        for name, id_val in lookup_cache[key].items()]
+    
+    # Fetch accounting books (Multi-Book Accounting)
+    # Try multiple approaches since different NetSuite versions/permissions may vary
+    books_loaded = False
+    try:
+        # Approach 1: Try to get distinct accounting books from transactions
+        # This works even without direct AccountingBook table access
+        books_query = """
+            SELECT DISTINCT tal.accountingbook AS id
+            FROM TransactionAccountingLine tal
+            WHERE tal.accountingbook IS NOT NULL
+        """
+        books_result = query_netsuite(books_query, timeout=15)
+        
+        if isinstance(books_result, list) and len(books_result) > 0:
+            print(f"✓ Found {len(books_result)} accounting books from transactions", file=sys.stderr)
+            # ID 1 is always Primary Book in NetSuite
+            book_ids = [str(row.get('id', '')) for row in books_result]
+            lookups['accountingBooks'] = [
+                {
+                    'id': book_id,
+                    'name': "Primary Book" if book_id == '1' else f"Book {book_id}",
+                    'isPrimary': book_id == '1'
+                }
+                for book_id in book_ids
+            ]
+            books_loaded = True
+        elif not isinstance(books_result, list):
+            complete = False
+    except Exception as e:
+        print(f"Approach 1 (distinct from TAL) failed: {e}", file=sys.stderr)
+        complete = False
+    
+    if not books_loaded:
+        # Approach 2: Default to Primary Book (always exists)
+        print(f"Using default Primary Book (ID 1)", file=sys.stderr)
+        lookups['accountingBooks'].append({
+            'id': '1',
+            'name': 'Primary Book',
+            'isPrimary': True
+        })
+    
+    # Fetch budget categories
+    lookups['budgetCategories'] = []
+    try:
+        cat_query = """
+            SELECT id, name
+            FROM BudgetCategory
+            ORDER BY name
+        """
+        cat_result = query_netsuite(cat_query)
         
-        # Fetch budget categories
-        lookups['budgetCategories'] = []
-        try:
-            cat_query = """
-                SELECT id, name
-                FROM BudgetCategory
-                ORDER BY name
-            """
-            cat_result = query_netsuite(cat_query)
-            
-            if isinstance(cat_result, list):
-                for row in cat_result:
-                    lookups['budgetCategories'].append({
-                        'id': str(row.get('id', '')),
-                        'name': row.get('name', '')
-                    })
-        except Exception as e:
-            print(f"Error loading budget categories: {e}", file=sys.stderr)
-            # Budget categories may not exist in all accounts
+        if isinstance(cat_result, list):
+            lookups['budgetCategories'] = [
+                {'id': str(row.get('id', '')), 'name': row.get('name', '')}
+                for row in cat_result
+            ]
+        else:
+            complete = False
+    except Exception as e:
+        print(f"Error loading budget categories: {e}", file=sys.stderr)
+        # Budget categories may not exist in all accounts
+        complete = False
+    
+    return lookups, complete
+
+
+def refresh_lookups_payload():
+    """
+    Rebuild, serialize and gzip the /lookups/all payload.
+    
+    Only a complete payload is kept for reuse - one with a failed sub-query is
+    served to this caller but rebuilt on the next request.
+    
+    Returns:
+        (body, gzip body, etag, built_at)
+    """
+    global lookups_payload
+    lookups, complete = build_lookups_payload()
+    body = app.json.dumps(lookups).encode('utf-8')
+    payload = (
+        body,
+        gzip.compress(body, compresslevel=6),  # repetitive names/IDs compress ~5-10x
+        hashlib.blake2b(body, digest_size=16).hexdigest(),
+        time.time()
+    )
+    if complete:
+        lookups_payload = payload
+    else:
+        print("⚠️ /lookups/all built with failed sub-queries - not cached", file=sys.stderr)
+    return payload
+
+
+def lookups_payload_fresh(payload):
+    """True if a cached /lookups/all payload exists and is younger than LOOKUPS_PAYLOAD_TTL"""
+    return payload is not None and (time.time() - payload[3]) < LOOKUPS_PAYLOAD_TTL
+
+
+@app.route('/lookups/all')
+def get_all_lookups():
+    """
+    Get all lookups at once - Subsidiary, Department, Location, Class, Accounting Books
+    Served from the body pre-serialized at startup (rebuilt after /cache/clear or
+    once it's older than LOOKUPS_PAYLOAD_TTL)
+    
+    Carries a strong ETag, so a client re-opening the workbook with If-None-Match
+    gets a 304 instead of re-downloading unchanged dropdown data. Clients that
+    accept gzip get the pre-compressed body (no per-request compression).
+    """
+    try:
+        payload = lookups_payload
+        if not lookups_payload_fresh(payload):
+            # Double-checked: concurrent first requests (or after /cache/clear / expiry)
+            # wait for one build instead of each re-running the lookup queries
+            with lookups_payload_lock:
+                payload = lookups_payload
+                if not lookups_payload_fresh(payload):
+                    payload = refresh_lookups_payload()
+        body, gzip_body, etag, _ = payload
+        # Strong validators must differ per representation - the gzip body gets its own ETag
+        if 'gzip' in request.accept_encodings:
+            body, etag = gzip_body, f"{etag}-gz"
+            encoding = 'gzip'
+        else:
+            encoding = None
         
-        return jsonify(lookups)
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype='application/json')
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.vary.add('Accept-Encoding')
+        return response
         
     except Exception as e:
+        app.logger.exception("Error building /lookups/all payload")
         return jsonify({'error': str(e)}), 500
 
 
@@ -6761,7 +7412,7 @@ def resolve_subsidiary_id(subsidiary_param):
     return None
 
 
-def build_consolidate_amount(target_sub, period_ref='t.postingperiod'):
+def build_consolidate_amount(target_sub, period_ref='t.postingperiod', amount_ref='tal.amount'):
     """
     Build the BUILTIN.CONSOLIDATE SQL fragment for multi-currency consolidation.
     
@@ -6780,15 +7431,20 @@ def build_consolidate_amount(target_sub, period_ref='t.postingperiod'):
     Args:
         target_sub: Target subsidiary ID for consolidation
         period_ref: SQL reference to the period (default: t.postingperiod)
+        amount_ref: SQL reference to the amount (default: tal.amount; bm.amount for budgets)
     
     Returns:
         SQL fragment that calculates consolidated amount
+        (plain amount_ref when the account has a single subsidiary - nothing to consolidate)
     """
-    # Always use BUILTIN.CONSOLIDATE - it works for both OneWorld and non-OneWorld
+    if single_subsidiary:
+        return amount_ref
+    
+    # BUILTIN.CONSOLIDATE works for both OneWorld and non-OneWorld
     return f"""
         TO_NUMBER(
             BUILTIN.CONSOLIDATE(
-                tal.amount,
+                {amount_ref},
                 'LEDGER',
                 'DEFAULT',
                 'DEFAULT',
@@ -6874,7 +7530,7 @@ def calculate_retained_earnings():
         # Parse fy_start date for comparison
         from datetime import datetime
         try:
-            fy_start_date = datetime.strptime(fy_start, '%m/%d/%Y').strftime('%Y-%m-%d')
+            fy_start_date = parse_ns_date(fy_start).strftime('%Y-%m-%d')
         except:
             fy_start_date = fy_start
         
@@ -6891,7 +7547,7 @@ def calculate_retained_earnings():
         
         # Build simpler consolidation SQL without CROSS JOIN (faster execution)
         if target_sub:
-            cons_amount = f"""TO_NUMBER(BUILTIN.CONSOLIDATE(tal.amount, 'LEDGER', 'DEFAULT', 'DEFAULT', {target_sub}, {target_period_id}, 'DEFAULT'))"""
+            cons_amount = build_consolidate_amount(target_sub, target_period_id)
         else:
             cons_amount = "tal.amount"
         
@@ -6901,7 +7557,7 @@ def calculate_retained_earnings():
         # Get period_end_date for posted RE query
         period_end = fy_info['period_end']
         try:
-            period_end_date = datetime.strptime(period_end, '%m/%d/%Y').strftime('%Y-%m-%d')
+            period_end_date = parse_ns_date(period_end).strftime('%Y-%m-%d')
         except:
             period_end_date = period_end
         
@@ -7113,11 +7769,11 @@ def calculate_net_income():
         # Parse dates - use range_start (either FY start or custom fromPeriod start)
         from datetime import datetime
         try:
-            range_start_date = datetime.strptime(range_start, '%m/%d/%Y').strftime('%Y-%m-%d')
+            range_start_date = parse_ns_date(range_start).strftime('%Y-%m-%d')
         except:
             range_start_date = range_start
         try:
-            period_end_date = datetime.strptime(period_end, '%m/%d/%Y').strftime('%Y-%m-%d')
+            period_end_date = parse_ns_date(period_end).strftime('%Y-%m-%d')
         except:
             period_end_date = period_end
         
@@ -7140,7 +7796,7 @@ def calculate_net_income():
         
         # Build simpler consolidation SQL without CROSS JOIN (faster execution)
         if target_sub:
-            cons_amount = f"""TO_NUMBER(BUILTIN.CONSOLIDATE(tal.amount, 'LEDGER', 'DEFAULT', 'DEFAULT', {target_sub}, {target_period_id}, 'DEFAULT'))"""
+            cons_amount = build_consolidate_amount(target_sub, target_period_id)
         else:
             cons_amount = "tal.amount"
         
@@ -7363,7 +8019,7 @@ def calculate_type_balance():
         # Parse end date
         from datetime import datetime
         try:
-            to_end_date = datetime.strptime(to_end, '%m/%d/%Y').strftime('%Y-%m-%d')
+            to_end_date = parse_ns_date(to_end).strftime('%Y-%m-%d')
         except:
             to_end_date = to_end
         
@@ -7375,7 +8031,7 @@ def calculate_type_balance():
             sign_sql = f"* CASE WHEN a.accttype IN ({SIGN_FLIP_TYPES_SQL}) THEN -1 ELSE 1 END"
             
             # Use BUILTIN.CONSOLIDATE with target period for exchange rates
-            cons_amount = f"""TO_NUMBER(BUILTIN.CONSOLIDATE(tal.amount, 'LEDGER', 'DEFAULT', 'DEFAULT', {target_sub}, {target_period_id}, 'DEFAULT'))"""
+            cons_amount = build_consolidate_amount(target_sub, target_period_id)
             
             query = f"""
                 SELECT SUM({cons_amount} {sign_sql}) AS balance
@@ -7398,7 +8054,7 @@ def calculate_type_balance():
             
             from_start = from_period_info['period_start']
             try:
-                from_start_date = datetime.strptime(from_start, '%m/%d/%Y').strftime('%Y-%m-%d')
+                from_start_date = parse_ns_date(from_start).strftime('%Y-%m-%d')
             except:
                 from_start_date = from_start
             
@@ -7408,7 +8064,7 @@ def calculate_type_balance():
             sign_sql = f"* CASE WHEN a.accttype IN ({INCOME_TYPES_SQL}) THEN -1 ELSE 1 END"
             
             # Use BUILTIN.CONSOLIDATE
-            cons_amount = f"""TO_NUMBER(BUILTIN.CONSOLIDATE(tal.amount, 'LEDGER', 'DEFAULT', 'DEFAULT', {target_sub}, t.postingperiod, 'DEFAULT'))"""
+            cons_amount = build_consolidate_amount(target_sub, 't.postingperiod')
             
             query = f"""
                 SELECT SUM({cons_amount} {sign_sql}) AS balance
@@ -7579,7 +8235,7 @@ def batch_typebalance_refresh():
                 col_name = 'dec_month' if month_abbr == 'dec' else month_abbr
                 month_cases.append(f"""
                     SUM(CASE WHEN t.postingperiod = {period_id} THEN 
-                        TO_NUMBER(BUILTIN.CONSOLIDATE(tal.amount, 'LEDGER', 'DEFAULT', 'DEFAULT', {target_sub}, t.postingperiod, 'DEFAULT'))
+                        {build_consolidate_amount(target_sub)}
                         * CASE WHEN a.accttype IN ({income_types_sql}) THEN -1 ELSE 1 END
                     ELSE 0 END) AS {col_name}
                 """)
@@ -7728,11 +8384,11 @@ def calculate_cta():
         
         from datetime import datetime
         try:
-            period_end_date = datetime.strptime(period_end, '%m/%d/%Y').strftime('%Y-%m-%d')
+            period_end_date = parse_ns_date(period_end).strftime('%Y-%m-%d')
         except:
             period_end_date = period_end
         try:
-            fy_start_date = datetime.strptime(fy_start, '%m/%d/%Y').strftime('%Y-%m-%d')
+            fy_start_date = parse_ns_date(fy_start).strftime('%Y-%m-%d')
         except:
             fy_start_date = fy_start
         
@@ -7772,7 +8428,7 @@ def calculate_cta():
         # Using COALESCE would mix currencies (USD + INR + EUR = garbage)
         # Trust CONSOLIDATE to handle subsidiary hierarchy and currency translation
         if target_sub:
-            cons_amount = f"""TO_NUMBER(BUILTIN.CONSOLIDATE(tal.amount, 'LEDGER', 'DEFAULT', 'DEFAULT', {target_sub}, {target_period_id}, 'DEFAULT'))"""
+            cons_amount = build_consolidate_amount(target_sub, target_period_id)
         else:
             cons_amount = "tal.amount"
         
@@ -7988,6 +8644,15 @@ def calculate_cta():
         return jsonify({'error': str(e)}), 500
 
 
+# Warm the lookup cache eagerly when served by a WSGI server (start.sh sets
+# WARM_LOOKUP_CACHE=1 for gunicorn), so the first Excel request doesn't pay the load.
+# Opt-in so plain imports (tooling, tests) never fire NetSuite queries. Runs in the
+# background to keep worker boot fast; requests arriving mid-load wait on
+# lookup_cache_lock instead of re-querying.
+if __name__ != '__main__' and os.environ.get('WARM_LOOKUP_CACHE') == '1':
+    threading.Thread(target=load_lookup_cache, name='lookup-cache-warm', daemon=True).start()
+
+
 if __name__ == '__main__':
     print("=" * 80)
     print("NetSuite Excel Formulas - Backend Server")
@@ -8012,11 +8677,20 @@ if __name__ == '__main__':
     print()
     print("Loading name-to-ID lookup cache...")
     load_lookup_cache()
+    refresh_lookups_payload()
     print()
     print("Press Ctrl+C to stop")
     print("=" * 80)
     print()
     
     # Run server
-    app.run(host='127.0.0.1', port=5002, debug=False)
+    # Prefer a production WSGI server (waitress) when installed - the Werkzeug dev
+    # server would otherwise serialize Excel requests behind each NetSuite round-trip.
+    # Threads (not processes) so all requests share the in-memory caches above.
+    try:
+        from waitress import serve
+        print("Serving with waitress (8 threads)")
+        serve(app, host='127.0.0.1', port=5002, threads=8)
+    except ImportError:
+        app.run(host='127.0.0.1', port=5002, debug=False, threaded=True)
 
@@ -7,5 +7,12 @@ echo "Starting NetSuite Excel Formulas backend server..."
 echo "Press Ctrl+C to stop"
 echo ""
 
-python3 server.py
+# Use gunicorn when available: 1 worker (caches are in-process) with 8 threads,
+# so concurrent Excel requests overlap their NetSuite round-trips.
+# WARM_LOOKUP_CACHE=1 has the worker load the lookup cache in the background on boot
+if command -v gunicorn >/dev/null 2>&1; then
+    export WARM_LOOKUP_CACHE=1
+    exec gunicorn --workers 1 --threads 8 --worker-class gthread --bind 127.0.0.1:5002 --timeout 300 server:app
+fi
 
+python3 server.py
@@ -0,0 +1,81 @@
+"""
+Regression tests for /batch/transactions
+
+query_netsuite keeps recent SuiteQL results in query_result_cache; batch_transactions
+pops the batch_key column off each row, so repeating a batch within the cache TTL
+must still route rows back to the right request.
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('flask')
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeResponse:
+    """Minimal stand-in for a requests.Response from the SuiteQL endpoint"""
+    
+    def __init__(self, items):
+        self.status_code = 200
+        self.content = json.dumps({'items': items}).encode('utf-8')
+        self.text = self.content.decode('utf-8')
+
+
+@pytest.fixture(scope='module')
+def server(tmp_path_factory):
+    """Import server.py against a dummy config and a throwaway disk cache"""
+    tmp = tmp_path_factory.mktemp('backend')
+    (tmp / 'netsuite_config.json').write_text(json.dumps({
+        'account_id': 'TEST',
+        'consumer_key': 'key',
+        'consumer_secret': 'secret',
+        'token_id': 'token',
+        'token_secret': 'token-secret'
+    }))
+    sys.path.insert(0, BACKEND_DIR)
+    import disk_cache
+    disk_cache.CACHE_DB_PATH = str(tmp / 'cache.db')
+    cwd = os.getcwd()
+    os.chdir(tmp)
+    try:
+        import server
+    finally:
+        os.chdir(cwd)
+    return server
+
+
+def test_repeated_batch_routes_rows_to_each_request(server, monkeypatch):
+    posted = []
+    
+    def fake_post(url, json=None, timeout=None):
+        posted.append(json['q'])
+        if 'batch_key' not in json['q']:
+            return FakeResponse([])
+        return FakeResponse([
+            {'batch_key': 0, 'transaction_id': '10', 'record_type': 'invoice', 'debit': '5'},
+            {'batch_key': 1, 'transaction_id': '20', 'record_type': 'bill', 'credit': '7'}
+        ])
+    
+    monkeypatch.setattr(server.netsuite_session, 'post', fake_post)
+    server.query_result_cache.clear()
+    client = server.app.test_client()
+    batch = {'requests': [
+        {'account': '4000', 'period': 'Jan 2025'},
+        {'account': '5000', 'period': 'Jan 2025'}
+    ]}
+    
+    first = client.post('/batch/transactions', json=batch).get_json()
+    second = client.post('/batch/transactions', json=batch).get_json()
+    
+    # The repeat is served from query_result_cache, not a second NetSuite call
+    assert sum('batch_key' in q for q in posted) == 1
+    for response in (first, second):
+        counts = [result['count'] for result in response['results']]
+        assert counts == [1, 1]
+        assert response['results'][0]['transactions'][0]['transaction_id'] == '10'
+        assert response['results'][1]['transactions'][0]['transaction_id'] == '20'